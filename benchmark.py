@@ -0,0 +1,94 @@
+#Mohammed Adel Alshreif (MLS)
+# Acquisition benchmark: runs the engine against synthetic sources and reports
+# the sustained samples/s and the data lost at every stage, per configuration.
+#   python benchmark.py                       default matrix, 3 s per run
+#   python benchmark.py --rates 0 --pty       only unthrottled (max) rates, also through a pty
+#   python benchmark.py --json results.json   keep the numbers to compare runs
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from engine import AcquisitionEngine, FrameParser, LineParser, Metrics
+
+def run(rate, channels, fmt, pty, seconds, log, poll_interval):
+    spec = f"sim:rate={rate},channels={channels},format={fmt}"
+    if pty:
+        spec = f"pty:{spec}"
+    if fmt == 'frames':
+        create_parser = lambda: FrameParser(channels, 'int16', '<', b'\xAA\x55', 'none')
+    else:
+        create_parser = LineParser
+    metrics = Metrics()
+    with tempfile.TemporaryDirectory() as directory:
+        log_filename = os.path.join(directory, 'bench.bin') if log else None
+        engine = AcquisitionEngine([(spec, 2000000)], create_parser, log_filename, metrics=metrics)
+        reader = engine.ports.readers[0]
+        source = reader.serial.source if pty else reader.serial
+        engine.start()
+        started = time.monotonic()
+        while time.monotonic() - started < seconds and not engine.error:
+            time.sleep(poll_interval)
+            engine.poll()
+        engine.stop()
+        engine.poll()
+        engine.close()
+        elapsed = time.monotonic() - started
+
+    counters = metrics.snapshot()['counters']
+    received = counters.get('samples', 0)
+    parse_errors = counters.get('parse_errors', 0)
+    return {
+        'source': spec,
+        'log': log,
+        'seconds': round(elapsed, 3),
+        'target_rate': rate,
+        'generated': source.generated,
+        'received': received,
+        'samples_per_s': round(received / elapsed),
+        'mb_per_s': round(counters.get('bytes_read', 0) / elapsed / 1e6, 2),
+        'overrun_samples': source.overrun_samples,
+        'dropped_samples': counters.get('dropped_samples', 0),
+        'parse_errors': parse_errors,
+        # generated but never parsed: still in the source or pty buffer when the
+        # run stopped, or a partial line. Overruns were never generated and
+        # dropped samples are part of received, so neither is subtracted.
+        'in_flight': source.generated - received - parse_errors,
+        'error': engine.error,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure sustained acquisition throughput.")
+    parser.add_argument('--rates', type=int, nargs='+', default=[10000, 100000, 0],
+                        help="samples/s per run, 0 is unthrottled")
+    parser.add_argument('--channels', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--formats', nargs='+', choices=['csv', 'frames'], default=['csv', 'frames'])
+    parser.add_argument('--pty', action='store_true', help="also run every configuration through a pty")
+    parser.add_argument('--no-log', action='store_true', help="do not write a log file")
+    parser.add_argument('--seconds', type=float, default=3.0, help="duration of each run")
+    parser.add_argument('--poll-interval', type=float, default=1 / 30, help="engine poll interval (GUI frame)")
+    parser.add_argument('--json', help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    columns = ['source', 'samples_per_s', 'mb_per_s', 'generated', 'received',
+               'overrun_samples', 'dropped_samples', 'parse_errors', 'in_flight']
+    print('  '.join(f"{name:>16}" if i else f"{name:<44}" for i, name in enumerate(columns)))
+    results = []
+    for pty in ([False, True] if args.pty else [False]):
+        for fmt in args.formats:
+            for channels in args.channels:
+                for rate in args.rates:
+                    result = run(rate, channels, fmt, pty, args.seconds, not args.no_log, args.poll_interval)
+                    results.append(result)
+                    print('  '.join(f"{result[name]:>16}" if i else f"{result[name]:<44}"
+                                    for i, name in enumerate(columns)))
+                    if result['error']:
+                        print(f"  error: {result['error']}", file=sys.stderr)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
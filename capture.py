@@ -0,0 +1,134 @@
+#Mohammed Adel Alshreif (MLS)
+# Headless capture: logs one or more serial ports at full rate without the GUI.
+#   python capture.py COM3 --baud 115200 --duration 3600 --rotate-size 100 -o run.csv
+#   python capture.py /dev/ttyUSB0@921600 /dev/ttyUSB1@115200 --format frames --channels 8
+#   python capture.py COM3 --trigger-level 2.5 --hysteresis 0.1 --pre 1000 --post 4000 --triggered-only
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+
+import serial
+
+from engine import (
+    AcquisitionEngine, CHECKSUM_SIZES, DEVICE_TIME_SCALES, FrameParser, LineParser, Metrics,
+    TRIGGER_EDGES, TRIGGER_MODES, Trigger, format_metrics_summary
+)
+
+def parse_port(text, baudrate):
+    # "PORT" or "PORT@BAUD"
+    port, _, baud = text.rpartition('@') if '@' in text else (text, '', '')
+    return port, int(baud) if baud else baudrate
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Log serial ports without the GUI.")
+    parser.add_argument('ports', nargs='+', help="PORT or PORT@BAUD, one per device")
+    parser.add_argument('-b', '--baud', type=int, default=115200, help="baudrate for ports without @BAUD")
+    parser.add_argument('-o', '--output', help="log file, .csv/.npy/.bin (default data_<time>.csv)")
+    parser.add_argument('--format', choices=['csv', 'frames'], default='csv', help="stream format")
+    parser.add_argument('--channels', type=int, default=4, help="channels per binary frame")
+    parser.add_argument('--dtype', default='int16', help="binary frame value type")
+    parser.add_argument('--byteorder', choices=['<', '>'], default='<', help="binary frame byte order")
+    parser.add_argument('--sync', default='AA55', help="binary frame sync header, hex")
+    parser.add_argument('--checksum', choices=list(CHECKSUM_SIZES), default='none')
+    parser.add_argument('--device-time', choices=list(DEVICE_TIME_SCALES),
+                        help="first column is a device timestamp in this unit")
+    parser.add_argument('--duration', type=float, help="seconds to capture (default until Ctrl+C)")
+    parser.add_argument('--rotate-size', type=float, help="start a new log segment every N MB")
+    parser.add_argument('--rotate-time', type=float, help="start a new log segment every N seconds")
+    parser.add_argument('--trigger-level', type=float, help="trigger on this level (enables the trigger)")
+    parser.add_argument('--trigger-channel', type=int, default=1, help="channel the trigger watches, from 1")
+    parser.add_argument('--trigger-edge', choices=TRIGGER_EDGES, default='rising')
+    parser.add_argument('--trigger-mode', choices=TRIGGER_MODES, default='normal',
+                        help="single stops the capture after the first trigger")
+    parser.add_argument('--hysteresis', type=float, default=0.0, help="trigger hysteresis, in signal units")
+    parser.add_argument('--holdoff', type=float, default=0.0, help="seconds after a trigger before the next")
+    parser.add_argument('--pre', type=int, default=500, help="samples kept before each trigger")
+    parser.add_argument('--post', type=int, default=500, help="samples kept from each trigger on")
+    parser.add_argument('--triggered-only', action='store_true',
+                        help="log only the triggered captures, one indexed segment each")
+    parser.add_argument('--metrics', help="write a JSON line of metrics every --interval seconds to this file")
+    parser.add_argument('--interval', type=float, default=1.0, help="status interval in seconds")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    output = args.output or f"data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    if args.triggered_only and args.trigger_level is None:
+        print("--triggered-only needs --trigger-level", file=sys.stderr)
+        return 2
+
+    metrics = Metrics()
+    try:
+        ports = [parse_port(text, args.baud) for text in args.ports]
+        if args.format == 'frames':
+            sync = bytes.fromhex(args.sync)
+            create_parser = lambda: FrameParser(args.channels, args.dtype, args.byteorder, sync, args.checksum)
+        else:
+            create_parser = LineParser
+        trigger = None
+        if args.trigger_level is not None:
+            trigger = Trigger(args.trigger_channel - 1, args.trigger_level, args.trigger_edge, args.hysteresis,
+                              args.holdoff, args.pre, args.post, args.trigger_mode)
+        engine = AcquisitionEngine(
+            ports, create_parser, output, DEVICE_TIME_SCALES.get(args.device_time),
+            rotate_bytes=int(args.rotate_size * 1000000) if args.rotate_size else None,
+            rotate_seconds=args.rotate_time, metrics=metrics, trigger=trigger, trigger_only=args.triggered_only
+        )
+    except (serial.SerialException, OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    metrics_file = open(args.metrics, 'w') if args.metrics else None
+    print(f"Logging {', '.join(engine.ports.names)} to {output}", file=sys.stderr)
+    if engine.log_writer.index_name:
+        print(f"Segments are listed in {engine.log_writer.index_name}", file=sys.stderr)
+
+    engine.start()
+    started = time.monotonic()
+    next_status = started + args.interval
+    error = None
+    try:
+        while args.duration is None or time.monotonic() - started < args.duration:
+            time.sleep(0.05)
+            engine.poll()
+            error = engine.error
+            if error:
+                break
+            if engine.trigger_error:
+                print(f"Trigger off: {engine.trigger_error}", file=sys.stderr)
+                if args.triggered_only:
+                    # nothing else would ever be logged
+                    error = f"Trigger error: {engine.trigger_error}"
+                    break
+                engine.trigger_error = None
+            for times, _, index in engine.captures:
+                if index is not None:
+                    print(f"Triggered at {times[index]} (#{trigger.count})", file=sys.stderr)
+            if trigger and not trigger.armed and not trigger.waiting:
+                break
+            if time.monotonic() >= next_status:
+                next_status += args.interval
+                snapshot = metrics.snapshot()
+                print(format_metrics_summary(snapshot), file=sys.stderr)
+                if metrics_file:
+                    metrics_file.write(json.dumps(snapshot) + '\n')
+                    metrics_file.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.stop()
+        engine.poll()
+        engine.close()
+        if metrics_file:
+            metrics_file.write(json.dumps(metrics.snapshot()) + '\n')
+            metrics_file.close()
+
+    print(f"Stopped. {engine.stats_text()}", file=sys.stderr)
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+#Mohammed Adel Alshreif (MLS)
+# Streaming signal processing on sample batches (samples x channels). Filters
+# keep their state between batches, so a signal filtered in chunks is the same
+# as filtered in one go. NaN samples (a port that has not sent yet, a gap) come
+# out as NaN and are held at the channel's previous value inside the filter, so
+# they never poison its state. Only numpy is needed.
+import numpy as np
+
+FILTER_TYPES = ["None", "Moving Average", "FIR Low-pass", "IIR Low-pass", "IIR High-pass"]
+
+def estimate_rate(times):
+    # mean sample rate in Hz over datetime64 timestamps, None if it can't be told
+    if len(times) < 2:
+        return None
+    span = (times[-1] - times[0]) / np.timedelta64(1, 's')
+    return (len(times) - 1) / span if span > 0 else None
+
+def hold_gaps(values, last):
+    # values with non-finite samples replaced by the channel's previous finite
+    # value (last carries it between batches, NaN if there is none yet); leading
+    # gaps of a channel without one take its first finite value in the batch.
+    # Returns the filled values, the finite mask and the new last.
+    finite = np.isfinite(values)
+    if finite.all():
+        return values, finite, values[-1].copy()
+    rows = np.arange(len(values))[:, None]
+    previous = np.maximum.accumulate(np.where(finite, rows, -1), axis=0)
+    columns = np.arange(values.shape[1])
+    filled = np.where(previous >= 0, values[np.maximum(previous, 0), columns], last)
+    following = np.minimum.accumulate(np.where(finite, rows, len(values))[::-1], axis=0)[::-1]
+    leading = np.isnan(filled) & (following < len(values))
+    filled[leading] = values[np.minimum(following, len(values) - 1), columns][leading]
+    return filled, finite, filled[-1].copy()
+
+# Mean of the last length samples, from a running sum: O(1) per sample at any length.
+class MovingAverage:
+    def __init__(self, length):
+        self.length = length
+        self._tail = None
+        self._last = None
+
+    def process(self, values):
+        if self._tail is None:
+            self._last = np.full(values.shape[1], np.nan)
+            self._tail = np.empty((self.length - 1, values.shape[1]))
+        starting = np.isnan(self._last)
+        values, finite, self._last = hold_gaps(values, self._last)
+        # a channel starts as if its first sample had always been there, no ramp from zero
+        self._tail[:, starting] = values[0, starting]
+        extended = np.concatenate([self._tail, values])
+        sums = np.cumsum(extended, axis=0)
+        sums = np.concatenate([np.zeros((1, values.shape[1])), sums])
+        self._tail = extended[len(extended) - (self.length - 1):]
+        return np.where(finite, (sums[self.length:] - sums[:-self.length]) / self.length, np.nan)
+
+class FirFilter:
+    def __init__(self, taps):
+        self.taps = np.asarray(taps, dtype=np.float64)
+        self._tail = None
+        self._last = None
+
+    def process(self, values):
+        if self._tail is None:
+            self._last = np.full(values.shape[1], np.nan)
+            self._tail = np.empty((len(self.taps) - 1, values.shape[1]))
+        starting = np.isnan(self._last)
+        values, finite, self._last = hold_gaps(values, self._last)
+        self._tail[:, starting] = values[0, starting]
+        extended = np.concatenate([self._tail, values])
+        self._tail = extended[len(extended) - (len(self.taps) - 1):]
+        out = np.stack([np.convolve(column, self.taps, mode='valid') for column in extended.T], axis=1)
+        return np.where(finite, out, np.nan)
+
+# IIR filter b/a run in state space (transposed direct form II) one block of
+# block samples at a time: the response to a block is two matrix products, so a
+# batch costs len/block small matmuls instead of a Python step per sample.
+class IirFilter:
+    def __init__(self, b, a, block=256):
+        b, a = np.asarray(b, dtype=np.float64), np.asarray(a, dtype=np.float64)
+        b, a = b / a[0], a / a[0]
+        order = max(len(a), len(b)) - 1
+        b = np.pad(b, (0, order + 1 - len(b)))
+        a = np.pad(a, (0, order + 1 - len(a)))
+        self.order = order
+        self.block = block
+        self.state = None
+        self._last = None
+
+        A = np.zeros((order, order))
+        A[:, 0] = -a[1:]
+        A[:-1, 1:] = np.eye(order - 1)
+        B = self._input = b[1:] - a[1:] * b[0]
+        powers = [np.eye(order)]
+        for _ in range(block):
+            powers.append(A @ powers[-1])
+        # y[k] = C A^k s0 + sum_j h[k - j] x[j] with C = [1, 0, ...], h[0] = b0
+        self._observe = np.array([power[0] for power in powers[:block]])
+        impulse = np.concatenate([[b[0]], [power[0] @ B for power in powers[:block - 1]]])
+        rows, columns = np.indices((block, block))
+        self._toeplitz = np.where(rows >= columns, impulse[np.abs(rows - columns)], 0.0)
+        self._powers = powers
+        self._reach = np.stack([powers[block - 1 - j] @ B for j in range(block)], axis=1)
+        # state for a constant input of 1, scaled to start in the steady state
+        self._steady = np.linalg.solve(np.eye(order) - A, B)
+
+    def process(self, values):
+        if self.state is None:
+            self.state = np.zeros((self.order, values.shape[1]))
+            self._last = np.full(values.shape[1], np.nan)
+        starting = np.isnan(self._last)
+        values, finite, self._last = hold_gaps(values, self._last)
+        # a channel starts in the steady state for its first finite sample
+        starting &= ~np.isnan(values[0])
+        if starting.any():
+            self.state[:, starting] = np.outer(self._steady, values[0, starting])
+        x_all = np.nan_to_num(values)
+        out = np.empty_like(x_all)
+        for start in range(0, len(values), self.block):
+            x = x_all[start:start + self.block]
+            n = len(x)
+            out[start:start + n] = self._observe[:n] @ self.state + self._toeplitz[:n, :n] @ x
+            self.state = self._powers[n] @ self.state + self._reach[:, self.block - n:] @ x
+        return np.where(finite, out, np.nan)
+
+def fir_lowpass(cutoff, rate, taps=63):
+    # windowed sinc with unity gain at DC
+    n = np.arange(taps) - (taps - 1) / 2
+    h = np.sinc(2 * cutoff / rate * n) * np.hamming(taps)
+    return h / h.sum()
+
+def biquad(kind, cutoff, rate, q=np.sqrt(0.5)):
+    # RBJ audio EQ cookbook second order low-pass / high-pass, returns (b, a)
+    w0 = 2 * np.pi * cutoff / rate
+    alpha = np.sin(w0) / (2 * q)
+    cos = np.cos(w0)
+    if kind == 'lowpass':
+        b = np.array([(1 - cos) / 2, 1 - cos, (1 - cos) / 2])
+    else:
+        b = np.array([(1 + cos) / 2, -(1 + cos), (1 + cos) / 2])
+    a = np.array([1 + alpha, -2 * cos, 1 - alpha])
+    return b, a
+
+def make_filter(kind, rate=None, cutoff=None, length=16):
+    if kind == "Moving Average":
+        return MovingAverage(length)
+    if kind == "FIR Low-pass":
+        return FirFilter(fir_lowpass(cutoff, rate, length | 1))
+    if kind == "IIR Low-pass":
+        return IirFilter(*biquad('lowpass', cutoff, rate))
+    if kind == "IIR High-pass":
+        return IirFilter(*biquad('highpass', cutoff, rate))
+    return None
+
+# Power spectrum of the newest size samples of every channel: Hann window,
+# mean removed, exponentially averaged over successive calls. Meant to be
+# called once per display frame on the ring buffer, not per sample. A buffer
+# shorter than size is zero padded, so the frequency bins stay the same.
+class Spectrum:
+    def __init__(self, size=1024, averaging=0.5):
+        self.size = size
+        self.averaging = averaging
+        self.window = None
+        self.average = None
+
+    def update(self, times, data):
+        n = min(self.size, data.shape[1])
+        if n < 16:
+            return None
+        if self.window is None or len(self.window) != n:
+            self.window = np.hanning(n)
+            self.scale = 1 / (self.window ** 2).sum()
+        x = np.nan_to_num(data[:, data.shape[1] - n:])
+        x = x - x.mean(axis=1, keepdims=True)
+        power = np.abs(np.fft.rfft(x * self.window, n=self.size, axis=1)) ** 2 * self.scale
+        if self.average is None or self.average.shape != power.shape:
+            self.average = power
+        else:
+            self.average = self.averaging * self.average + (1 - self.averaging) * power
+        # normalized frequency (cycles per sample) if the rate is unknown
+        rate = estimate_rate(times[len(times) - n:]) or 1.0
+        return np.fft.rfftfreq(self.size, 1 / rate), 10 * np.log10(self.average + 1e-20)
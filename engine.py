@@ -0,0 +1,1166 @@
+#Mohammed Adel Alshreif (MLS)
+# Acquisition engine: serial readers, stream parsers, triggers, log writers and metrics.
+# Nothing here imports Qt, pyqtgraph or pandas, so it can run headless.
+import serial
+import csv
+import io
+import json
+import os
+import queue
+import struct
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+import numpy as np
+
+# Local wall clock time in int64 nanoseconds, read from the monotonic high
+# resolution counter. The offset is taken once, so stamps never jump when the
+# system clock is adjusted and every reader shares the same time base.
+CLOCK_OFFSET_NS = int(np.datetime64(datetime.now(), 'ns').astype(np.int64)) - time.perf_counter_ns()
+
+def host_time_ns():
+    return time.perf_counter_ns() + CLOCK_OFFSET_NS
+
+# Log2 histogram of durations: bucket k counts durations below 2**k microseconds
+# (and at least 2**(k-1)), which is cheap enough to update on every call.
+class TimingHistogram:
+    def __init__(self, buckets=32):
+        self.counts = [0] * buckets
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def add(self, ns):
+        self.counts[min((ns // 1000).bit_length(), len(self.counts) - 1)] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def percentile(self, q):
+        # upper bound of the bucket holding the q-th fraction of the calls, in us
+        rank = q * self.count
+        seen = 0
+        for k, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                return float(1 << k)
+        return 0.0
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean_us': self.total_ns / self.count / 1000 if self.count else 0.0,
+            'p50_us': self.percentile(0.5),
+            'p99_us': self.percentile(0.99),
+            'max_us': self.max_ns / 1000,
+        }
+
+# Counters, gauges and timing histograms shared by the reader, log writer and
+# GUI threads. Updates are read-modify-write, which the GIL does not make
+# atomic, so they and snapshot() hold one lock; it is taken a few times per
+# chunk, not per sample. snapshot() adds per second rates for the counters
+# since the previous snapshot.
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.timings = {}
+        self.started = time.monotonic()
+        self._last_time = self.started
+        self._last_counters = {}
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def timing(self, name, ns):
+        with self._lock:
+            histogram = self.timings.get(name)
+            if histogram is None:
+                histogram = self.timings[name] = TimingHistogram()
+            histogram.add(ns)
+
+    def snapshot(self):
+        with self._lock:
+            now = time.monotonic()
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            timings = {name: histogram.snapshot() for name, histogram in self.timings.items()}
+        elapsed = max(now - self._last_time, 1e-9)
+        rates = {name: (value - self._last_counters.get(name, 0)) / elapsed for name, value in counters.items()}
+        self._last_time, self._last_counters = now, counters
+        return {
+            'time': datetime.now().isoformat(timespec='milliseconds'),
+            'uptime_s': round(now - self.started, 3),
+            'counters': counters,
+            'rates': rates,
+            'gauges': gauges,
+            'timings': timings,
+        }
+
+def format_metrics(snapshot):
+    lines = [f"uptime {snapshot['uptime_s']:.1f} s", "", "counters (total, per second):"]
+    for name, value in sorted(snapshot['counters'].items()):
+        lines.append(f"  {name:<20} {value:>14} {snapshot['rates'][name]:>14.1f}")
+    lines += ["", "gauges:"]
+    for name, value in sorted(snapshot['gauges'].items()):
+        lines.append(f"  {name:<34} {value:>14}")
+    lines += ["", f"timings (µs): {'count':>10} {'mean':>10} {'p50':>10} {'p99':>10} {'max':>10}"]
+    for name, timing in sorted(snapshot['timings'].items()):
+        lines.append(f"  {name:<12} {timing['count']:>10} {timing['mean_us']:>10.1f} {timing['p50_us']:>10.0f} "
+                     f"{timing['p99_us']:>10.0f} {timing['max_us']:>10.1f}")
+    return '\n'.join(lines)
+
+# One line status for the status bar and the headless capture.
+def format_metrics_summary(snapshot):
+    rates, counters, timings = snapshot['rates'], snapshot['counters'], snapshot['timings']
+    p99 = [f"{label} {timings[name]['p99_us']:.0f} µs"
+           for name, label in [('parse', 'parse'), ('log_write', 'log'), ('render', 'render')] if name in timings]
+    return (f"{rates.get('bytes_read', 0) / 1024:.1f} kB/s, {rates.get('samples', 0):.0f} samples/s, "
+            f"{counters.get('parse_errors', 0)} parse errors" + (f", p99 {' / '.join(p99)}" if p99 else ""))
+
+# scale from a device timestamp column unit to nanoseconds
+DEVICE_TIME_SCALES = {'us': 1000, 'ms': 1000000, 's': 1000000000}
+# Turns raw CSV bytes into a samples x channels array. Partial trailing lines are
+# kept for the next chunk. Regular chunks are converted in one np.fromstring
+# call; a chunk with any irregular line falls back to line by line parsing so
+# only the bad lines are dropped (and counted). Without a channel count, the
+# lines are held back until detect_lines of them agree on one.
+class LineParser:
+    def __init__(self, channels=None, max_line_bytes=65536, detect_lines=3):
+        self.channels = channels
+        self.max_line_bytes = max_line_bytes
+        self.detect_lines = detect_lines
+        self.malformed = 0
+        self.dropped_bytes = 0
+        self._pending = b''
+        self._synced = False
+        self._detecting = b''
+
+    def feed(self, chunk):
+        data = self._pending + chunk
+        cut = data.rfind(b'\n') + 1
+        self._pending = data[cut:]
+        if len(self._pending) > self.max_line_bytes:
+            # no newline for too long, the stream is garbage
+            self.dropped_bytes += len(self._pending)
+            self._pending = b''
+        return self.parse(data[:cut])
+
+    def parse(self, data):
+        data = data.replace(b'\r', b'')
+        if self.channels is None:
+            if not self._synced:
+                # the port may have been opened mid-line, so the first line is
+                # likely a fragment; drop it rather than count channels from it
+                cut = data.find(b'\n') + 1
+                if cut == 0:
+                    return self._empty()
+                self.dropped_bytes += cut
+                data = data[cut:]
+                self._synced = True
+            data = self._detecting + data
+            self._detect_channels(data)
+            if self.channels is None:
+                if len(data) > self.max_line_bytes:
+                    # no channel count in sight, the stream is garbage
+                    self.malformed += len([line for line in data.split(b'\n') if line.strip()])
+                    data = b''
+                self._detecting = data
+                return self._empty()
+            self._detecting = b''
+
+        values = self._parse_fast(data)
+        if values is None:
+            values = self._parse_slow(data)
+        return values
+
+    def _empty(self):
+        return np.empty((0, self.channels or 0), dtype=np.float64)
+
+    def _detect_channels(self, data):
+        # the most common field count once enough lines have it, so one odd
+        # line cannot set it
+        counts = Counter()
+        for line in data.split(b'\n'):
+            try:
+                counts[len([float(v) for v in line.split(b',')])] += 1
+            except ValueError:
+                continue
+        if counts:
+            channels, seen = counts.most_common(1)[0]
+            if seen >= self.detect_lines:
+                self.channels = channels
+
+    def _parse_fast(self, data):
+        raw = np.frombuffer(data, dtype=np.uint8)
+        ends = np.flatnonzero(raw == ord('\n'))
+        if len(ends) == 0:
+            return self._empty()
+        # every line must hold exactly channels - 1 commas and no line may be empty
+        commas = np.flatnonzero(raw == ord(','))
+        per_line = np.bincount(np.searchsorted(ends, commas), minlength=len(ends))
+        if (per_line != self.channels - 1).any() or (np.diff(ends, prepend=-1) == 1).any():
+            return None
+        try:
+            values = np.fromstring(data[:-1].replace(b'\n', b',').decode('ascii'), sep=',')
+        except ValueError:
+            return None
+        if values.size != len(ends) * self.channels:
+            return None
+        return values.reshape(len(ends), self.channels)
+
+    def _parse_slow(self, data):
+        rows = []
+        for line in data.split(b'\n'):
+            if not line.strip():
+                continue
+            try:
+                row = [float(v) for v in line.split(b',')]
+            except ValueError:
+                self.malformed += 1
+                continue
+            if len(row) != self.channels:
+                self.malformed += 1
+                continue
+            rows.append(row)
+        if not rows:
+            return self._empty()
+        return np.array(rows, dtype=np.float64)
+
+CHECKSUM_SIZES = {'none': 0, 'sum8': 1, 'xor8': 1, 'crc16': 2}
+
+def _crc16_table():
+    table = np.zeros(256, dtype=np.uint16)
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table[i] = crc & 0xFFFF
+    return table
+
+CRC16_TABLE = _crc16_table()
+
+# Decodes fixed-size binary frames: [sync][channels x dtype][checksum].
+# Checksums cover the payload only; crc16 is CRC-16/CCITT-FALSE stored with the
+# frame byte order. Runs of good frames are decoded with one np.frombuffer; on a
+# bad frame the parser skips ahead to the next sync header.
+class FrameParser:
+    def __init__(self, channels, dtype='int16', byteorder='<', sync=b'\xAA\x55', checksum='none'):
+        self.channels = channels
+        self.dtype = np.dtype(dtype).newbyteorder(byteorder)
+        self.byteorder = byteorder
+        self.sync = sync
+        self.checksum = checksum
+        self.payload_size = channels * self.dtype.itemsize
+        self.frame_size = len(sync) + self.payload_size + CHECKSUM_SIZES[checksum]
+        self.malformed = 0
+        self.dropped_bytes = 0
+        self._sync = np.frombuffer(sync, dtype=np.uint8)
+        self._pending = b''
+
+    def feed(self, chunk):
+        data = self._pending + chunk
+        decoded = []
+        pos = 0
+        while True:
+            start = data.find(self.sync, pos)
+            if start < 0:
+                # keep what could be the start of a split sync header
+                keep = max(pos, len(data) - len(self.sync) + 1)
+                self.dropped_bytes += keep - pos
+                pos = keep
+                break
+            self.dropped_bytes += start - pos
+            pos = start
+
+            count = (len(data) - pos) // self.frame_size
+            if count == 0:
+                break
+            frames = np.frombuffer(data, dtype=np.uint8, count=count * self.frame_size,
+                                   offset=pos).reshape(count, self.frame_size)
+            bad = np.flatnonzero(~self._valid(frames))
+            good = bad[0] if len(bad) else count
+            if good:
+                decoded.append(self._decode(frames[:good]))
+            pos += good * self.frame_size
+            if good < count:
+                self.malformed += 1
+                self.dropped_bytes += 1
+                pos += 1
+        self._pending = data[pos:]
+
+        if not decoded:
+            return np.empty((0, self.channels), dtype=np.float64)
+        return np.concatenate(decoded)
+
+    def _valid(self, frames):
+        sync_size = len(self.sync)
+        valid = (frames[:, :sync_size] == self._sync).all(axis=1)
+        if self.checksum == 'none':
+            return valid
+        payload = frames[:, sync_size:sync_size + self.payload_size]
+        stored = frames[:, sync_size + self.payload_size:]
+        if self.checksum == 'sum8':
+            expected = payload.sum(axis=1, dtype=np.uint32) & 0xFF
+            return valid & (stored[:, 0] == expected)
+        if self.checksum == 'xor8':
+            return valid & (stored[:, 0] == np.bitwise_xor.reduce(payload, axis=1))
+        crc = np.full(len(frames), 0xFFFF, dtype=np.uint16)
+        for column in payload.T:
+            crc = (crc << 8) ^ CRC16_TABLE[((crc >> 8) ^ column) & 0xFF]
+        stored = np.ascontiguousarray(stored).view(np.dtype(np.uint16).newbyteorder(self.byteorder))[:, 0]
+        return valid & (stored == crc)
+
+    def _decode(self, frames):
+        sync_size = len(self.sync)
+        payload = np.ascontiguousarray(frames[:, sync_size:sync_size + self.payload_size])
+        return payload.view(self.dtype).astype(np.float64)
+
+# Base of the sources that produce bytes in software instead of reading a port.
+# They offer the part of the serial.Serial API that SerialReader uses (port,
+# in_waiting, read and close) and, like a UART driver, only buffer max_buffer
+# bytes; samples that do not fit are dropped and counted in overrun_samples.
+class VirtualSource:
+    timeout = 0.05
+
+    def __init__(self, port, max_buffer=1 << 20):
+        self.port = port
+        self.max_buffer = max_buffer
+        self.generated = 0
+        self.overrun_samples = 0
+        self._buffer = bytearray()
+
+    @property
+    def in_waiting(self):
+        self._fill()
+        return len(self._buffer)
+
+    def read(self, size=1):
+        deadline = time.monotonic() + self.timeout
+        self._fill()
+        while not self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return b''
+            time.sleep(min(remaining, 0.001))
+            self._fill()
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def _fill(self):
+        space = self.max_buffer - len(self._buffer)
+        self._buffer += self._produce(space)
+
+    def _produce(self, space):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+# Sine waves with noise on every channel, as ASCII CSV lines or binary frames
+# (AA55 sync, little endian int16, no checksum: the Frame Setup defaults). One
+# period is encoded up front so producing samples is only slicing bytes. With
+# rate 0 the source is unthrottled and produces block samples per fill.
+class SyntheticSource(VirtualSource):
+    def __init__(self, rate=1000, channels=4, format='csv', period=4096, block=4096, seed=0, **kwargs):
+        super().__init__(f"sim:rate={rate:g},channels={channels},format={format}", **kwargs)
+        self.rate = rate
+        self.block = block
+        self.period = period
+        phase = 2 * np.pi * np.arange(period)[:, None] / period * np.arange(1, channels + 1)
+        noise = np.random.default_rng(seed).normal(0, 50, (period, channels))
+        values = np.round(1000 * np.sin(phase) + noise).astype('<i2')
+        if format == 'frames':
+            records = [b'\xAA\x55' + row.tobytes() for row in values]
+        else:
+            records = [(','.join(map(str, row)) + '\n').encode() for row in values.tolist()]
+        # two periods back to back so any run of up to one period is one slice
+        self._table = b''.join(records) * 2
+        self._offsets = np.concatenate([[0], np.cumsum([len(record) for record in records * 2])])
+        self._record_size = max(len(record) for record in records)
+        self._started = time.monotonic()
+
+    def _produce(self, space):
+        if self.rate:
+            due = int((time.monotonic() - self._started) * self.rate) - self.generated - self.overrun_samples
+        else:
+            due = self.block if space == self.max_buffer else 0
+        fits = min(due, space // self._record_size)
+        self.overrun_samples += due - fits
+        chunks = []
+        while fits > 0:
+            start = self.generated % self.period
+            count = min(fits, self.period)
+            chunks.append(self._table[self._offsets[start]:self._offsets[start + count]])
+            self.generated += count
+            fits -= count
+        return b''.join(chunks)
+
+# Plays a CSV log written by this program back as the device stream: the time
+# column is stripped and each line is sent when its recorded time comes up,
+# speed times faster than real time (speed 0: as fast as possible).
+class ReplaySource(VirtualSource):
+    def __init__(self, file_name, speed=1.0, **kwargs):
+        super().__init__(f"replay:{file_name}", **kwargs)
+        self.speed = speed
+        self.file = open(file_name, 'rb')
+        self._line = None
+        self._first = None
+        self._started = time.monotonic()
+
+    @staticmethod
+    def _seconds(stamp):
+        # "HH:MM:SS.ffffff" or any fraction length
+        hours, minutes, seconds = stamp.split(b':')
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    def _produce(self, space):
+        elapsed = (time.monotonic() - self._started) * self.speed
+        lines = []
+        size = 0
+        while True:
+            if self._line is None:
+                self._line = self.file.readline()
+                if not self._line:
+                    self._line = None
+                    break
+            stamp, _, values = self._line.partition(b',')
+            try:
+                t = self._seconds(stamp)
+            except ValueError:
+                # a header or a broken line, skip it
+                self._line = None
+                continue
+            if self._first is None:
+                self._first = t
+            if t < self._first - 43200:
+                t += 86400  # passed midnight
+            if self.speed and t - self._first > elapsed:
+                break
+            if size + len(values) + 1 > space:
+                if not self.speed:
+                    break
+                self.overrun_samples += 1
+                self._line = None
+                continue
+            self._line = None
+            lines.append(values if values.endswith(b'\n') else values + b'\n')
+            size += len(lines[-1])
+            self.generated += 1
+            if not self.speed and size >= 65536:
+                break
+        return b''.join(lines)
+
+    def close(self):
+        self.file.close()
+
+# Feeds another source through a pseudo terminal and reads it back with a real
+# serial.Serial on the slave side, so the whole pyserial and OS tty path is
+# exercised without hardware. POSIX only.
+class PtyLoopback:
+    def __init__(self, source, baudrate):
+        if not hasattr(os, 'openpty'):
+            raise OSError("pty loopback needs a POSIX system")
+        self.source = source
+        self.port = f"pty:{source.port}"
+        self._master, slave = os.openpty()
+        self.serial = serial.Serial(os.ttyname(slave), baudrate, timeout=0.05)
+        os.close(slave)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._pump, daemon=True)
+        self._thread.start()
+
+    def _pump(self):
+        try:
+            while not self._stopped.is_set():
+                data = self.source.read(65536)
+                while data and not self._stopped.is_set():
+                    data = data[os.write(self._master, data):]
+        except OSError:
+            pass
+
+    @property
+    def in_waiting(self):
+        return self.serial.in_waiting
+
+    def read(self, size=1):
+        return self.serial.read(size)
+
+    def close(self):
+        self._stopped.set()
+        self.serial.close()
+        self._thread.join(timeout=1)
+        os.close(self._master)
+        self.source.close()
+
+def _source_options(text):
+    options = {}
+    for item in filter(None, text.split(',')):
+        key, _, value = item.partition('=')
+        for convert in (int, float):
+            try:
+                value = convert(value)
+                break
+            except ValueError:
+                continue
+        options[key.strip()] = value
+    return options
+
+# Opens what SerialReader reads from. Besides real port names this understands
+#   sim:rate=10000,channels=4,format=csv   synthetic data (format csv or frames)
+#   replay:capture.csv,speed=10            a recorded CSV log
+#   pty:<any of the above>                 the same through a pseudo terminal
+def open_source(port, baudrate):
+    kind, _, rest = port.partition(':')
+    if kind == 'sim':
+        return SyntheticSource(**_source_options(rest))
+    if kind == 'replay':
+        file_name, _, options = rest.partition(',')
+        return ReplaySource(file_name, **_source_options(options))
+    if kind == 'pty':
+        return PtyLoopback(open_source(rest, baudrate), baudrate)
+    return serial.Serial(port, baudrate, timeout=0.05)
+
+# Owns the port (or a virtual source) and reads it off the GUI thread. Parsed
+# batches go to the GUI through a bounded deque; if the GUI falls behind,
+# batches are dropped and counted instead of blocking the port.
+class SerialReader(threading.Thread):
+    def __init__(self, port, baudrate, parser=None, max_batches=2000, device_time_scale=None, metrics=None):
+        super().__init__(daemon=True)
+        self.serial = open_source(port, baudrate)
+        self.parser = parser or LineParser()
+        self.metrics = metrics or Metrics()
+        self.queue = deque()
+        self.max_batches = max_batches
+        self.device_time_scale = device_time_scale
+        self.error = None
+        self._stopped = threading.Event()
+        # 10 bits per byte on the wire (8N1)
+        self.byte_ns = 10 * 1000000000 // baudrate
+        self.last_read_ns = None
+        self.device_origin = None
+
+        self.bytes_read = 0
+        self.samples_read = 0
+        self.dropped_samples = 0
+        self.dropped_bytes = 0
+        self.max_backlog = 0
+
+    def run(self):
+        try:
+            while not self._stopped.is_set():
+                waiting = self.serial.in_waiting
+                if waiting > self.max_backlog:
+                    self.max_backlog = waiting
+                self.metrics.gauge(f"backlog_bytes {self.serial.port}", waiting)
+                self.metrics.gauge(f"queue_batches {self.serial.port}", len(self.queue))
+                started = time.perf_counter_ns()
+                chunk = self.serial.read(waiting or 1)
+                if chunk:
+                    now = host_time_ns()
+                    self.metrics.timing('read', time.perf_counter_ns() - started)
+                    self.metrics.count('bytes_read', len(chunk))
+                    self.metrics.count('chunks')
+                    self.bytes_read += len(chunk)
+                    self._handle_chunk(chunk, now)
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.serial.close()
+
+    @property
+    def channels(self):
+        if self.parser.channels is None or not self.device_time_scale:
+            return self.parser.channels
+        return self.parser.channels - 1
+
+    def _handle_chunk(self, chunk, now):
+        # the chunk took at least len(chunk) byte times to arrive, and arrived
+        # after the previous read; its samples are spread evenly over that span
+        start = now - len(chunk) * self.byte_ns
+        if self.last_read_ns is not None:
+            start = max(start, self.last_read_ns)
+        self.last_read_ns = now
+        malformed, dropped_bytes = self.parser.malformed, self.parser.dropped_bytes
+        started = time.perf_counter_ns()
+        values = self.parser.feed(chunk)
+        self.metrics.timing('parse', time.perf_counter_ns() - started)
+        self.metrics.count('parse_errors', self.parser.malformed - malformed)
+        self.metrics.count('dropped_bytes', self.parser.dropped_bytes - dropped_bytes)
+        n = len(values)
+        if n == 0:
+            return
+
+        if self.device_time_scale:
+            device_times, values = values[:, 0], values[:, 1:]
+            if self.device_origin is None:
+                self.device_origin = (device_times[0], now)
+            device_start, host_start = self.device_origin
+            times = host_start + np.round((device_times - device_start) * self.device_time_scale).astype(np.int64)
+        else:
+            times = start + (now - start) * np.arange(1, n + 1, dtype=np.int64) // n
+
+        self.samples_read += n
+        self.metrics.count('samples', n)
+        if len(self.queue) >= self.max_batches:
+            self.dropped_samples += n
+            self.dropped_bytes += len(chunk)
+            self.metrics.count('dropped_samples', n)
+            self.metrics.count('dropped_bytes', len(chunk))
+            return
+        self.queue.append((times.astype('datetime64[ns]').astype('datetime64[us]'), values))
+
+    def drain(self):
+        batches = []
+        while self.queue:
+            batches.append(self.queue.popleft())
+        return batches
+
+    def stop(self):
+        self._stopped.set()
+        if self.is_alive():
+            self.join(timeout=1)
+
+    def stats_text(self):
+        dropped_bytes = self.dropped_bytes + self.parser.dropped_bytes
+        return (f"{self.bytes_read} bytes, {self.samples_read} samples, "
+                f"dropped {self.dropped_samples} samples / {dropped_bytes} bytes, "
+                f"{self.parser.malformed} malformed, peak backlog {self.max_backlog} bytes")
+
+# Each NaN cell takes the last value above it; last (1 x channels) carries the
+# values between batches and is returned updated. For display only: logs keep
+# the NaN so repeated values are never mistaken for new samples.
+def sample_and_hold(values, last):
+    merged = np.concatenate([last, values])
+    rows = np.where(np.isnan(merged), 0, np.arange(len(merged))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    merged = np.take_along_axis(merged, rows, axis=0)
+    return merged[1:], merged[-1:]
+
+# Reads several ports at once, one SerialReader thread each, so a slow port
+# never holds up the others. Batches are merged on the shared clock into one
+# stream where every port has its own block of columns (named by
+# channel_names()); a row holds the values of the port that sent it and NaN in
+# the columns of the other ports.
+class PortGroup:
+    def __init__(self, readers):
+        self.readers = readers
+        self.names = [reader.serial.port for reader in readers]
+        self.offsets = None
+
+    @classmethod
+    def open(cls, ports, create_parser, device_time_scale=None, metrics=None):
+        readers = []
+        try:
+            for port, baudrate in ports:
+                readers.append(SerialReader(port, baudrate, create_parser(),
+                                            device_time_scale=device_time_scale, metrics=metrics))
+        except Exception:
+            for reader in readers:
+                reader.serial.close()
+            raise
+        return cls(readers)
+
+    @property
+    def error(self):
+        for name, reader in zip(self.names, self.readers):
+            if reader.error:
+                return f"{name}: {reader.error}" if len(self.readers) > 1 else reader.error
+        return None
+
+    def start(self):
+        for reader in self.readers:
+            reader.start()
+
+    def stop(self):
+        for reader in self.readers:
+            reader.stop()
+
+    def waiting_for(self):
+        # ports whose channel count is not known yet
+        return [name for name, reader in zip(self.names, self.readers) if reader.channels is None]
+
+    def channel_names(self):
+        if len(self.readers) == 1:
+            return [f"Channel {i+1}" for i in range(self.readers[0].channels)]
+        return [f"{name} Ch{i+1}" for name, reader in zip(self.names, self.readers)
+                for i in range(reader.channels)]
+
+    def drain(self):
+        if len(self.readers) == 1:
+            return self.readers[0].drain()
+        if self.offsets is None:
+            # the column layout is fixed once every port has reported its channels
+            if self.waiting_for():
+                return []
+            self.offsets = np.cumsum([0] + [reader.channels for reader in self.readers])
+
+        batches = [(i, times, values) for i, reader in enumerate(self.readers)
+                   for times, values in reader.drain()]
+        if not batches:
+            return []
+        times = np.concatenate([batch[1] for batch in batches])
+        merged = np.full((len(times), self.offsets[-1]), np.nan)
+        row = 0
+        for i, _, values in batches:
+            merged[row:row + len(values), self.offsets[i]:self.offsets[i + 1]] = values
+            row += len(values)
+        order = np.argsort(times, kind='stable')
+        return [(times[order], merged[order])]
+
+    def stats_text(self):
+        if len(self.readers) == 1:
+            return self.readers[0].stats_text()
+        return "; ".join(f"{name}: {reader.stats_text()}" for name, reader in zip(self.names, self.readers))
+
+# Plain text log, a "Time,<channel names>" header and then one
+# "HH:MM:SS.ffffff,v1,v2,..." line per sample.
+class CsvLogFormat:
+    extension = '.csv'
+
+    def __init__(self, file, channels, names=None):
+        self.file = file
+        if names:
+            # quoted where needed, port specs like "sim:rate=1000,channels=4" hold commas
+            header = io.StringIO()
+            csv.writer(header, lineterminator='\n').writerow(["Time"] + list(names))
+            self.file.write(header.getvalue().encode())
+
+    def write(self, times, values):
+        stamps = np.datetime_as_string(times, unit='us')
+        self.file.write(''.join(
+            f"{stamp[11:]},{','.join(map(str, row))}\n"
+            for stamp, row in zip(stamps, values.tolist())
+        ).encode())
+
+    def close(self):
+        pass
+
+# Standard .npy file of records (time: datetime64[us], values: float64 x channels)
+# that np.load() can open. The header is rewritten with the final row count on close.
+# np.load() rejects extra header keys, so channel names are not stored here.
+class NpyLogFormat:
+    extension = '.npy'
+
+    def __init__(self, file, channels, names=None):
+        self.file = file
+        self.dtype = np.dtype([('time', 'M8[us]'), ('values', '<f8', (channels,))])
+        self.rows = 0
+        self._write_header(0)
+
+    def _write_header(self, rows):
+        descr = np.lib.format.dtype_to_descr(self.dtype)
+        header = f"{{'descr': {descr!r}, 'fortran_order': False, 'shape': ({rows},), }}"
+        # room for the longest row count so the header size never changes
+        size = -(-(len(header) + 32) // 64) * 64
+        header = header.ljust(size - 10 - 1) + '\n'
+        self.file.write(b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1'))
+
+    def write(self, times, values):
+        records = np.empty(len(times), dtype=self.dtype)
+        records['time'] = times
+        records['values'] = values
+        self.file.write(records.tobytes())
+        self.rows += len(records)
+
+    def close(self):
+        self.file.flush()
+        self.file.seek(0)
+        self._write_header(self.rows)
+
+# Compact record file: a header (b'SPLT', version, channels, the byte length of
+# a JSON list of channel names, the list, and zero padding to a multiple of 8
+# bytes) followed by little endian records of int64 microseconds since the
+# epoch and float64 values.
+class BinLogFormat:
+    extension = '.bin'
+    magic = b'SPLT'
+    version = 2
+
+    def __init__(self, file, channels, names=None):
+        self.file = file
+        self.dtype = np.dtype([('time', '<i8'), ('values', '<f8', (channels,))])
+        names = json.dumps(list(names or [])).encode()
+        names += b'\0' * (-(12 + len(names)) % 8)
+        self.file.write(struct.pack('<4sHHI', self.magic, self.version, channels, len(names)) + names)
+
+    @classmethod
+    def read_header(cls, file_name):
+        # (channels, channel names or None, offset of the first record)
+        with open(file_name, 'rb') as f:
+            magic, version, channels = struct.unpack('<4sHH', f.read(8))
+            if magic != cls.magic or version != cls.version:
+                raise ValueError(f"{file_name} is not a version {cls.version} binary log")
+            size, = struct.unpack('<I', f.read(4))
+            names = json.loads(f.read(size).rstrip(b'\0') or b'[]')
+            return channels, names or None, 12 + size
+
+    def write(self, times, values):
+        records = np.empty(len(times), dtype=self.dtype)
+        records['time'] = times.astype('M8[us]').astype(np.int64)
+        records['values'] = values
+        self.file.write(records.tobytes())
+
+    def close(self):
+        pass
+
+LOG_FORMATS = {fmt.extension: fmt for fmt in [CsvLogFormat, NpyLogFormat, BinLogFormat]}
+INDEX_EXTENSION = '.index.json'
+# queued to a LogWriter to end the current segment
+NEW_SEGMENT = 'new segment'
+
+# Writes sample batches to disk on its own thread through a large buffer,
+# flushing every flush_interval seconds or flush_bytes bytes. With rotate_bytes
+# or rotate_seconds the log is split into "<name>_0000.csv", "<name>_0001.csv",
+# ... and a new segment is started once the current one is that big or old.
+# With segmented the caller decides where segments end through new_segment().
+# Segmented logs also get "<name>.index.json" listing every segment's file, time
+# range, sample count and per channel min/max. It is replaced after every flush,
+# so after a crash it still describes everything that reached the disk.
+class LogWriter(threading.Thread):
+    def __init__(self, file_name, flush_interval=1.0, flush_bytes=4 << 20, metrics=None,
+                 rotate_bytes=None, rotate_seconds=None, segmented=False):
+        super().__init__(daemon=True)
+        self.metrics = metrics or Metrics()
+        self.file_name = file_name
+        self.format_class = LOG_FORMATS.get(os.path.splitext(file_name)[1].lower(), CsvLogFormat)
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.segmented = segmented or bool(rotate_bytes or rotate_seconds)
+        self.segment = 0
+        self.file = open(self.segment_name(0), 'wb', buffering=flush_bytes)
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.queue = queue.Queue()
+        self.error = None
+        self.samples_written = 0
+        # set before the first write, written into the log headers and the index
+        self.channel_names = None
+        self.segments = []
+        self.index_name = None
+        if self.segmented:
+            self.index_name = os.path.splitext(file_name)[0] + INDEX_EXTENSION
+
+    def segment_name(self, segment):
+        if not self.segmented:
+            return self.file_name
+        root, extension = os.path.splitext(self.file_name)
+        return f"{root}_{segment:04d}{extension}"
+
+    def _track(self, times, values):
+        if not self.segments or self.segments[-1]['complete']:
+            self.segments.append({
+                'file': os.path.basename(self.segment_name(self.segment)),
+                'start': str(np.datetime_as_string(times[0], unit='us')),
+                'samples': 0, 'complete': False,
+                'min': np.full(values.shape[1], np.nan), 'max': np.full(values.shape[1], np.nan),
+            })
+        entry = self.segments[-1]
+        entry['end'] = str(np.datetime_as_string(times[-1], unit='us'))
+        entry['samples'] += len(times)
+        entry['min'] = np.fmin(entry['min'], np.nanmin(values, axis=0, initial=np.inf))
+        entry['max'] = np.fmax(entry['max'], np.nanmax(values, axis=0, initial=-np.inf))
+
+    def write_index(self):
+        if self.index_name is None or not self.segments:
+            return
+        # JSON has no NaN: channels without a finite value get null
+        bounds = lambda values: [float(v) if np.isfinite(v) else None for v in values]
+        segments = [dict(entry, min=bounds(entry['min']), max=bounds(entry['max'])) for entry in self.segments]
+        index = {
+            'version': 1,
+            'format': self.format_class.extension,
+            'channels': len(self.segments[0]['min']),
+            'channel_names': self.channel_names,
+            'segments': segments,
+        }
+        with open(self.index_name + '.tmp', 'w') as f:
+            json.dump(index, f, indent=1)
+        os.replace(self.index_name + '.tmp', self.index_name)
+
+    def write(self, times, values):
+        self.queue.put((times, values))
+
+    def new_segment(self):
+        self.queue.put(NEW_SEGMENT)
+
+    def run(self):
+        log = None
+        last_flush = segment_started = time.monotonic()
+        unflushed = 0
+        try:
+            while True:
+                try:
+                    batch = self.queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    batch = ()
+                if batch is None:
+                    break
+                end_segment = batch is NEW_SEGMENT
+                if end_segment:
+                    batch = ()
+                if batch:
+                    times, values = batch
+                    if log is None:
+                        log = self.format_class(self.file, values.shape[1], self.channel_names)
+                    started = time.perf_counter_ns()
+                    log.write(times, values)
+                    self.metrics.timing('log_write', time.perf_counter_ns() - started)
+                    self.metrics.count('samples_logged', len(times))
+                    self.samples_written += len(times)
+                    unflushed += values.nbytes
+                    if self.index_name:
+                        self._track(times, values)
+                self.metrics.gauge('log_queue_batches', self.queue.qsize())
+                now = time.monotonic()
+                if unflushed and (unflushed >= self.flush_bytes or now - last_flush >= self.flush_interval):
+                    started = time.perf_counter_ns()
+                    self.file.flush()
+                    self.metrics.timing('log_flush', time.perf_counter_ns() - started)
+                    unflushed = 0
+                    last_flush = now
+                    self.write_index()
+                rotate = (end_segment or (self.rotate_bytes and self.file.tell() >= self.rotate_bytes) or
+                          (self.rotate_seconds and now - segment_started >= self.rotate_seconds))
+                if log is not None and rotate:
+                    log.close()
+                    self.file.close()
+                    log = None
+                    if self.segments:
+                        self.segments[-1]['complete'] = True
+                    self.write_index()
+                    self.segment += 1
+                    self.file = open(self.segment_name(self.segment), 'wb', buffering=self.flush_bytes)
+                    self.metrics.count('log_segments')
+                    segment_started = now
+                    unflushed = 0
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            if log is not None:
+                log.close()
+            self.file.close()
+            # a segment opened after the last rotation that never got a sample
+            if log is None and self.segment > 0:
+                try:
+                    os.remove(self.segment_name(self.segment))
+                except OSError:
+                    pass
+            if self.segments:
+                self.segments[-1]['complete'] = True
+            try:
+                self.write_index()
+            except Exception as e:
+                self.error = self.error or str(e)
+
+    def close(self):
+        self.queue.put(None)
+        self.join()
+
+TRIGGER_EDGES = ['rising', 'falling', 'either']
+TRIGGER_MODES = ['auto', 'normal', 'single']
+
+# Oscilloscope style level trigger on one channel, evaluated on whole batches.
+# A rising edge fires when the channel reaches level after having been below
+# level - hysteresis (falling mirrors it), so noise around the level fires once.
+# Every trigger yields a capture (times, values, trigger index) of pre samples
+# before the trigger sample and post samples from it on; edges are ignored until
+# the post samples are in and holdoff seconds have passed. normal re-arms after
+# every capture and single after none. auto works like normal but also returns
+# the newest pre + post samples, with index None, when nothing triggered for
+# auto_timeout seconds.
+class Trigger:
+    def __init__(self, channel=0, level=0.0, edge='rising', hysteresis=0.0, holdoff=0.0,
+                 pre=500, post=500, mode='normal', auto_timeout=1.0):
+        if edge not in TRIGGER_EDGES or mode not in TRIGGER_MODES:
+            raise ValueError(f"unknown trigger edge {edge!r} or mode {mode!r}")
+        if pre < 0 or post < 1 or hysteresis < 0 or holdoff < 0:
+            raise ValueError("pre, hysteresis and holdoff can't be negative and post must be at least 1")
+        self.channel = channel
+        self.level = level
+        self.edge = edge
+        self.hysteresis = hysteresis
+        self.holdoff = np.timedelta64(int(holdoff * 1e6), 'us')
+        self.pre = pre
+        self.post = post
+        self.mode = mode
+        self.auto_timeout = np.timedelta64(int(auto_timeout * 1e6), 'us')
+        self.armed = True
+        self.count = 0
+        self.error = None
+        self._fired = {}
+        self._history = None
+        self._pending = None
+        self._holdoff_until = None
+        self._last_capture = None
+
+    @property
+    def waiting(self):
+        # True while a capture is still collecting its post samples
+        return self._pending is not None
+
+    def _crossings(self, key, arm, fire):
+        # indices where the detector goes from armed to fired; the state is kept
+        # per detector across batches and starts fired, so it has to arm first
+        last = np.where(arm | fire, np.arange(len(fire)), -1)
+        np.maximum.accumulate(last, out=last)
+        previous = self._fired.get(key, True)
+        fired = np.where(last >= 0, fire[np.maximum(last, 0)], previous)
+        self._fired[key] = bool(fired[-1])
+        return fired & ~np.concatenate([[previous], fired[:-1]])
+
+    def edges(self, x):
+        # NaN compares false, so it neither arms nor fires
+        edges = np.zeros(len(x), dtype=bool)
+        if self.edge in ('rising', 'either'):
+            edges |= self._crossings('rising', x < self.level - self.hysteresis, x >= self.level)
+        if self.edge in ('falling', 'either'):
+            edges |= self._crossings('falling', x > self.level + self.hysteresis, x <= self.level)
+        return np.flatnonzero(edges)
+
+    def process(self, times, values):
+        # values is samples x channels; returns the captures completed in this batch
+        captures = []
+        n = len(times)
+        if n == 0:
+            return captures
+        if values.shape[1] <= self.channel:
+            self.error = f"channel {self.channel + 1} does not exist"
+            return captures
+        edges = self.edges(values[:, self.channel])
+        if self._history is None:
+            self._history = (times[:0], values[:0])
+        offset = len(self._history[0])
+        all_times = np.concatenate([self._history[0], times])
+        all_values = np.concatenate([self._history[1], values])
+
+        pos = 0
+        if self._pending is not None:
+            pos = self._fill(times, values, captures)
+        while self.armed and pos < n:
+            k = int(np.searchsorted(edges, pos))
+            if k == len(edges):
+                break
+            i = int(edges[k])
+            if self._holdoff_until is not None and times[i] < self._holdoff_until:
+                pos = max(int(np.searchsorted(times, self._holdoff_until)), i + 1)
+                continue
+            self.count += 1
+            self.armed = self.mode != 'single'
+            self._last_capture = times[i]
+            self._holdoff_until = times[i] + self.holdoff
+            start, stop = max(offset + i - self.pre, 0), offset + i + self.post
+            if stop <= len(all_times):
+                captures.append((all_times[start:stop], all_values[start:stop], offset + i - start))
+                pos = i + self.post
+            else:
+                self._pending = ([all_times[start:]], [all_values[start:]], offset + i - start,
+                                 stop - len(all_times))
+                pos = n
+
+        if self.mode == 'auto' and not captures and self._pending is None:
+            if self._last_capture is None:
+                self._last_capture = times[0]
+            elif times[-1] - self._last_capture >= self.auto_timeout:
+                size = self.pre + self.post
+                captures.append((all_times[-size:], all_values[-size:], None))
+                self._last_capture = times[-1]
+
+        keep = len(all_times) - min(self.pre, len(all_times))
+        self._history = (all_times[keep:].copy(), all_values[keep:].copy())
+        return captures
+
+    def _fill(self, times, values, captures):
+        parts_times, parts_values, index, remaining = self._pending
+        take = min(remaining, len(times))
+        parts_times.append(times[:take])
+        parts_values.append(values[:take])
+        if take == remaining:
+            captures.append((np.concatenate(parts_times), np.concatenate(parts_values), index))
+            self._pending = None
+        else:
+            self._pending = (parts_times, parts_values, index, remaining - take)
+        return take
+
+# Acquisition without a GUI: opens the ports, merges their parsed streams and
+# hands every batch to the log writer. poll() returns the batches received since
+# the previous call so a display can draw them; headless capture drops them.
+# With a trigger, the captures completed during the last poll() are in
+# captures, and with trigger_only they are all that is logged, one segment each.
+# A trigger that can't run on the stream (a channel it doesn't have) is turned
+# off with its reason in trigger_error; acquisition and logging go on.
+class AcquisitionEngine:
+    def __init__(self, ports, create_parser=LineParser, log_filename=None, device_time_scale=None,
+                 rotate_bytes=None, rotate_seconds=None, metrics=None, trigger=None, trigger_only=False):
+        self.metrics = metrics or Metrics()
+        self.trigger = trigger
+        self.trigger_only = trigger_only
+        self.trigger_error = None
+        self.captures = []
+        # the ports first, so a port that can't be opened leaves no empty log behind
+        self.ports = PortGroup.open(ports, create_parser, device_time_scale, self.metrics)
+        self.log_writer = None
+        if log_filename:
+            try:
+                self.log_writer = LogWriter(log_filename, metrics=self.metrics, rotate_bytes=rotate_bytes,
+                                            rotate_seconds=rotate_seconds, segmented=trigger_only)
+            except Exception:
+                for reader in self.ports.readers:
+                    reader.serial.close()
+                raise
+
+    @property
+    def error(self):
+        if self.ports.error:
+            return self.ports.error
+        if self.log_writer and self.log_writer.error:
+            return f"Log error: {self.log_writer.error}"
+        return None
+
+    def start(self):
+        if self.log_writer:
+            self.log_writer.start()
+        self.ports.start()
+
+    def poll(self):
+        batches = self.ports.drain()
+        if batches and self.log_writer and self.log_writer.channel_names is None:
+            self.log_writer.channel_names = self.ports.channel_names()
+        self.captures = []
+        if self.trigger:
+            for times, values in batches:
+                self.captures.extend(self.trigger.process(times, values))
+            self.metrics.count('triggers', sum(index is not None for _, _, index in self.captures))
+            if self.trigger.error:
+                self.trigger_error, self.trigger = self.trigger.error, None
+        if self.log_writer and self.trigger_only:
+            for times, values, _ in self.captures:
+                self.log_writer.write(times, values)
+                self.log_writer.new_segment()
+        elif self.log_writer:
+            for times, values in batches:
+                self.log_writer.write(times, values)
+        return batches
+
+    def stop(self):
+        # stops reading; call poll() once more for what is still queued, then close()
+        self.ports.stop()
+
+    def close(self):
+        if self.log_writer:
+            self.log_writer.close()
+
+    def stats_text(self):
+        text = self.ports.stats_text()
+        if self.log_writer and self.log_writer.error:
+            text = f"{text} ⚠️ Log error: {self.log_writer.error}"
+        return text
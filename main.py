@@ -1,22 +1,359 @@
 #Mohammed Adel Alshreif (MLS)
 import sys
-import serial
 import serial.tools.list_ports
+import os
 import csv
+import json
+import struct
+import time
+from collections import OrderedDict, deque
 from datetime import datetime
+import numpy as np
 import pandas as pd
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QPushButton,
     QWidget, QComboBox, QLabel, QHBoxLayout, QFileDialog,
-    QTableWidget, QTableWidgetItem, QDialog, QGraphicsScene,
-    QGraphicsView, QGraphicsPixmapItem
+    QTableView, QHeaderView, QCheckBox, QDialog, QGraphicsScene,
+    QGraphicsView, QGraphicsPixmapItem, QFormLayout, QLineEdit,
+    QSpinBox, QDialogButtonBox, QPlainTextEdit
 )
-from PyQt5.QtCore import QTimer, Qt, pyqtSignal, QObject
+from PyQt5.QtCore import QTimer, Qt, pyqtSignal, QObject, QAbstractTableModel, QModelIndex
 from PyQt5.QtGui import QPixmap
 import pyqtgraph as pg
 import pyqtgraph.exporters
-import random
+from dsp import FILTER_TYPES, Spectrum, estimate_rate, make_filter
+from engine import (
+    AcquisitionEngine, BinLogFormat, CHECKSUM_SIZES, DEVICE_TIME_SCALES, FrameParser, INDEX_EXTENSION,
+    LineParser, Metrics, TRIGGER_EDGES, TRIGGER_MODES, Trigger, format_metrics, format_metrics_summary,
+    sample_and_hold
+)
 
+# timestamp source selector entries and the device time unit they stand for
+TIME_SOURCES = {"Host": None, "Device µs": 'us', "Device ms": 'ms', "Device s": 's'}
+# log rotation selector entries as (rotate_bytes, rotate_seconds)
+LOG_ROTATIONS = {
+    "Single File": (None, None),
+    "100 MB": (100000000, None), "1 GB": (1000000000, None),
+    "10 min": (None, 600), "1 hour": (None, 3600), "1 day": (None, 86400),
+}
+
+def format_timestamp(ts):
+    return ts.astype(datetime).strftime('%H:%M:%S.%f')
+
+# Fixed-size channels x capacity sample store. Every sample is written twice,
+# at i and i + capacity, so the samples in order are always one contiguous
+# slice and view() never copies.
+class RingBuffer:
+    def __init__(self, channels, capacity):
+        self.channels = channels
+        self.capacity = capacity
+        self.data = np.empty((channels, 2 * capacity), dtype=np.float64)
+        self.times = np.empty(2 * capacity, dtype='datetime64[us]')
+        self.start = 0
+        self.size = 0
+        self.total = 0
+
+    def __len__(self):
+        return self.size
+
+    def append_batch(self, times, values):
+        # values is samples x channels, as parsed from the stream
+        n = len(times)
+        if n == 0:
+            return
+        if n > self.capacity:
+            times = times[-self.capacity:]
+            values = values[-self.capacity:]
+            n = self.capacity
+
+        cap = self.capacity
+        pos = (self.start + self.size) % cap
+        end = pos + n
+        columns = values.T
+        self.data[:, pos:end] = columns
+        self.times[pos:end] = times
+        if end <= cap:
+            self.data[:, pos + cap:end + cap] = columns
+            self.times[pos + cap:end + cap] = times
+        else:
+            split = cap - pos
+            self.data[:, pos + cap:] = columns[:, :split]
+            self.times[pos + cap:] = times[:split]
+            self.data[:, :end - cap] = columns[:, split:]
+            self.times[:end - cap] = times[split:]
+
+        self.total += n
+        overflow = self.size + n - cap
+        if overflow > 0:
+            self.start = (self.start + overflow) % cap
+            self.size = cap
+        else:
+            self.size += n
+
+    def view(self):
+        stop = self.start + self.size
+        return self.times[self.start:stop], self.data[:, self.start:stop]
+
+    def resize(self, capacity):
+        times, data = self.view()
+        keep = min(self.size, capacity)
+        times, data = times[len(times) - keep:].copy(), data[:, data.shape[1] - keep:].copy()
+        total = self.total
+        self.__init__(self.channels, capacity)
+        self.append_batch(times, data.T)
+        self.total = total
+
+# Min, max, mean and RMS of every channel over the newest capacity samples,
+# kept up to date as batches arrive instead of rescanning the ring every frame.
+# Samples are summarized in blocks of block samples; per channel, a monotonic
+# deque of block numbers holds the candidates for the window min (and max), so
+# the oldest entry is the answer once the blocks that left the window are
+# dropped. The partial blocks at the two ends of the window are reduced from the
+# ring, so a frame costs O(block + capacity / block) instead of O(capacity).
+class WindowStats:
+    def __init__(self, channels, capacity, block=256):
+        self.channels = channels
+        self.capacity = capacity
+        self.block = block
+        self.count = 0
+        self.slots = capacity // block + 2
+        self.mins = np.empty((self.slots, channels))
+        self.maxs = np.empty((self.slots, channels))
+        self.sums = np.empty((self.slots, channels))
+        self.squares = np.empty((self.slots, channels))
+        self.counts = np.empty((self.slots, channels))
+        self.min_queues = [deque() for _ in range(channels)]
+        self.max_queues = [deque() for _ in range(channels)]
+        self._tail = np.empty((0, channels))
+
+    def extend(self, values):
+        # values is samples x channels, the same batch given to the ring
+        if len(values) == 0:
+            return
+        first = self.count // self.block
+        self.count += len(values)
+        values = np.concatenate([self._tail, values])
+        whole = len(values) - len(values) % self.block
+        self._tail = values[whole:].copy()
+        blocks = values[:whole].reshape(-1, self.block, self.channels)
+        # blocks older than the slots kept can never be in the window again
+        skip = max(len(blocks) - (self.slots - 1), 0)
+        blocks = blocks[skip:]
+        if len(blocks) == 0:
+            return
+        finite = np.isfinite(blocks)
+        zeroed = np.where(finite, blocks, 0.0)
+        # an all NaN block must never be the min or max
+        mins = np.nan_to_num(np.fmin.reduce(blocks, axis=1), nan=np.inf)
+        maxs = np.nan_to_num(np.fmax.reduce(blocks, axis=1), nan=-np.inf)
+        sums, squares, counts = zeroed.sum(axis=1), (zeroed ** 2).sum(axis=1), finite.sum(axis=1)
+
+        for j in range(len(blocks)):
+            k = first + skip + j
+            for c in range(self.channels):
+                low, high = self.min_queues[c], self.max_queues[c]
+                # the slot about to be reused must not be referenced any more
+                for queue in (low, high):
+                    while queue and queue[0] <= k - self.slots:
+                        queue.popleft()
+                while low and self.mins[low[-1] % self.slots, c] >= mins[j, c]:
+                    low.pop()
+                while high and self.maxs[high[-1] % self.slots, c] <= maxs[j, c]:
+                    high.pop()
+                low.append(k)
+                high.append(k)
+            slot = k % self.slots
+            self.mins[slot], self.maxs[slot] = mins[j], maxs[j]
+            self.sums[slot], self.squares[slot], self.counts[slot] = sums[j], squares[j], counts[j]
+
+    def compute(self, data):
+        # data is the ring's view (channels x samples); returns min, max, mean, rms per channel
+        size = data.shape[1]
+        if size == 0:
+            return None
+        start = self.count - size
+        lo, hi = -(-start // self.block), self.count // self.block
+        if lo >= hi:
+            edges = data
+            mins = np.full(self.channels, np.inf)
+            maxs = np.full(self.channels, -np.inf)
+            sums = squares = counts = np.zeros(self.channels)
+        else:
+            edges = np.concatenate([data[:, :lo * self.block - start],
+                                    data[:, size - (self.count - hi * self.block):]], axis=1)
+            for queue in self.min_queues + self.max_queues:
+                while queue and queue[0] < lo:
+                    queue.popleft()
+            mins = np.array([self.mins[queue[0] % self.slots, c] for c, queue in enumerate(self.min_queues)])
+            maxs = np.array([self.maxs[queue[0] % self.slots, c] for c, queue in enumerate(self.max_queues)])
+            slots = np.arange(lo, hi) % self.slots
+            sums = self.sums[slots].sum(axis=0)
+            squares = self.squares[slots].sum(axis=0)
+            counts = self.counts[slots].sum(axis=0)
+
+        if edges.shape[1]:
+            finite = np.isfinite(edges)
+            zeroed = np.where(finite, edges, 0.0)
+            mins = np.fmin(mins, np.fmin.reduce(edges, axis=1))
+            maxs = np.fmax(maxs, np.fmax.reduce(edges, axis=1))
+            sums, squares, counts = sums + zeroed.sum(axis=1), squares + (zeroed ** 2).sum(axis=1), counts + finite.sum(axis=1)
+        empty = counts == 0
+        counts = np.where(empty, 1, counts)
+        mins[np.isinf(mins)] = np.nan
+        maxs[np.isinf(maxs)] = np.nan
+        means = np.where(empty, np.nan, sums / counts)
+        rms = np.where(empty, np.nan, np.sqrt(squares / counts))
+        return mins, maxs, means, rms
+
+# Peak preserving min/max reduction of the ring buffer for drawing. Buckets are
+# aligned to absolute sample numbers (RingBuffer.total), so while data scrolls
+# only the buckets at both ends change and everything in between is reused.
+class MinMaxDecimator:
+    def __init__(self):
+        self.x = np.arange(0, dtype=np.float64)
+        self.reset()
+
+    def reset(self):
+        self.bucket = 0
+        self.first = 0
+        self.last = 0
+        self.mins = None
+        self.maxs = None
+
+    def decimate(self, data, total, width):
+        n = data.shape[1]
+        if n <= 2 * width:
+            if len(self.x) < n:
+                self.x = np.arange(max(n, 4 * width), dtype=np.float64)
+            self.reset()
+            return self.x[:n], data
+
+        bucket = 1 << int(np.ceil(np.log2(n / width)))
+        a0, a1 = total - n, total
+        first, last = a0 // bucket, (a1 - 1) // bucket + 1
+        if (self.mins is None or bucket != self.bucket or first < self.first
+                or first >= self.last or last < self.last):
+            self.bucket = bucket
+            mins, maxs = self._reduce(data, a0, first, last)
+        else:
+            # the previous last bucket may have been partial, so redo it
+            keep = slice(first - self.first, self.last - 1 - self.first)
+            tail_mins, tail_maxs = self._reduce(data, a0, self.last - 1, last)
+            mins = np.concatenate([self.mins[:, keep], tail_mins], axis=1)
+            maxs = np.concatenate([self.maxs[:, keep], tail_maxs], axis=1)
+            if a0 % bucket and keep.stop > keep.start:
+                mins[:, :1], maxs[:, :1] = self._reduce(data, a0, first, first + 1)
+        self.first, self.last = first, last
+        self.mins, self.maxs = mins, maxs
+
+        starts = np.maximum(np.arange(first, last) * bucket, a0)
+        ends = np.minimum(starts - starts % bucket + bucket, a1)
+        x = np.repeat((starts + ends - 1) / 2 - a0, 2)
+        y = np.stack([mins, maxs], axis=2).reshape(data.shape[0], -1)
+        return x, y
+
+    def _reduce(self, data, a0, first, last):
+        starts = np.maximum(np.arange(first, last) * self.bucket, a0) - a0
+        stop = min(last * self.bucket - a0, data.shape[1])
+        section = data[:, starts[0]:stop]
+        offsets = starts - starts[0]
+        return (np.minimum.reduceat(section, offsets, axis=1),
+                np.maximum.reduceat(section, offsets, axis=1))
+
+# Min/max pyramid for browsing long captures. Level k holds the min and max of
+# every min_bucket * 2**k samples, so any zoom level is drawn from about two
+# points per pixel of the visible window only. Windows finer than min_bucket are
+# reduced straight from the samples. Samples are added with extend(), in chunks
+# of any size; a partial last bucket is redone when more samples arrive.
+class MinMaxPyramid:
+    def __init__(self, channels, min_bucket=16):
+        self.channels = channels
+        self.min_bucket = min_bucket
+        self.total = 0
+        self.mins = []
+        self.maxs = []
+        self.sizes = []
+        self._tail = np.empty((channels, 0))
+
+    @classmethod
+    def build(cls, data, chunk_size=1 << 20):
+        pyramid = cls(data.shape[0])
+        for i in range(0, data.shape[1], chunk_size):
+            pyramid.extend(data[:, i:i + chunk_size])
+        return pyramid
+
+    def extend(self, data):
+        if data.shape[1] == 0:
+            return
+        first = self.total // self.min_bucket
+        self.total += data.shape[1]
+        data = np.concatenate([self._tail, data], axis=1)
+        partial = data.shape[1] % self.min_bucket
+        self._tail = data[:, data.shape[1] - partial:].copy()
+        offsets = np.arange(0, data.shape[1], self.min_bucket)
+        self._store(0, first, np.minimum.reduceat(data, offsets, axis=1),
+                    np.maximum.reduceat(data, offsets, axis=1))
+
+        level = 0
+        while self.sizes[level] > 1:
+            first //= 2
+            mins = self.mins[level][:, 2 * first:self.sizes[level]]
+            maxs = self.maxs[level][:, 2 * first:self.sizes[level]]
+            offsets = np.arange(0, mins.shape[1], 2)
+            self._store(level + 1, first, np.minimum.reduceat(mins, offsets, axis=1),
+                        np.maximum.reduceat(maxs, offsets, axis=1))
+            level += 1
+
+    def _store(self, level, first, mins, maxs):
+        if level == len(self.sizes):
+            self.mins.append(np.empty((self.channels, 0)))
+            self.maxs.append(np.empty((self.channels, 0)))
+            self.sizes.append(0)
+        size = first + mins.shape[1]
+        if size > self.mins[level].shape[1]:
+            # grow by doubling so extending in small chunks stays amortized O(n)
+            capacity = max(size, 2 * self.mins[level].shape[1])
+            for arrays in (self.mins, self.maxs):
+                grown = np.empty((self.channels, capacity))
+                grown[:, :self.sizes[level]] = arrays[level][:, :self.sizes[level]]
+                arrays[level] = grown
+        self.mins[level][:, first:size] = mins
+        self.maxs[level][:, first:size] = maxs
+        self.sizes[level] = size
+
+    def window(self, data, x0, x1, width):
+        # samples x0 <= i < x1 of data (channels x total) as x, y arrays for setData
+        x0, x1 = max(x0, 0), min(x1, self.total)
+        n = x1 - x0
+        if n <= 2 * width:
+            x1 = max(x1, x0)
+            return np.arange(x0, x1, dtype=np.float64), data[:, x0:x1]
+
+        bucket = 1 << int(np.ceil(np.log2(n / width)))
+        first, last = x0 // bucket, (x1 - 1) // bucket + 1
+        if bucket < self.min_bucket:
+            section = data[:, first * bucket:min(last * bucket, self.total)]
+            offsets = np.arange(0, section.shape[1], bucket)
+            mins = np.minimum.reduceat(section, offsets, axis=1)
+            maxs = np.maximum.reduceat(section, offsets, axis=1)
+        else:
+            level = min((bucket // self.min_bucket).bit_length() - 1, len(self.sizes) - 1)
+            bucket = self.min_bucket << level
+            first, last = x0 // bucket, (x1 - 1) // bucket + 1
+            mins = self.mins[level][:, first:last]
+            maxs = self.maxs[level][:, first:last]
+
+        starts = np.arange(first, last) * bucket
+        ends = np.minimum(starts + bucket, self.total)
+        x = np.repeat((starts + ends - 1) / 2, 2)
+        y = np.stack([mins, maxs], axis=2).reshape(data.shape[0], -1)
+        return x, y
+
+# A vertical cursor that shows the values of every channel at the sample under
+# it. The markers and label are created once and updated in place, and only when
+# the sample under the cursor or its values change, so calling update_position()
+# every frame costs the same at any sample rate. The x axis is the sample index
+# every view draws against, so the sample under the cursor is found directly.
 class DraggableCursor(QObject):
     positionChanged = pyqtSignal()
     def __init__(self, plot_widget, color, label_prefix, get_data_callback):
@@ -25,60 +362,405 @@ class DraggableCursor(QObject):
         self.color = color
         self.get_data = get_data_callback
         self.label_prefix = label_prefix
+        self.index = None
+        self.timestamp = None
+        self._shown = None
 
         self.line = pg.InfiniteLine(angle=90, movable=True, pen=pg.mkPen(color, width=2))
         self.text = pg.TextItem("", anchor=(0, 0.5), color=color)
-        self.dots = []
+        self.dots = pg.ScatterPlotItem(size=10)
+        self.brushes = []
+        self.colors = []
 
         self.plot_widget.addItem(self.line)
         self.plot_widget.addItem(self.text)
+        self.plot_widget.addItem(self.dots)
         self.line.sigPositionChanged.connect(self.update_position)
+        self.line.sigPositionChangeFinished.connect(self.snap)
 
         self.update_position()
 
-    def update_position(self):
-        x = int(self.line.value())
-        data_x, data_ys, timestamps = self.get_data()
+    def find_index(self):
+        return int(round(self.line.value()))
 
-        if 0 <= x < len(data_x):
-            for dot in self.dots:
-                self.plot_widget.removeItem(dot)
-            self.dots.clear()
-
-            lines = []
-            timestamp = timestamps[x].strftime('%H:%M:%S.%f')[:-3]
-            max_y = -float('inf')
-
-            for i, y_data in enumerate(data_ys):
-                if x < len(y_data):
-                    y = y_data[x]
-                    pen_color = pg.intColor(i)
-                    dot = pg.ScatterPlotItem(size=10, brush=pen_color, pen=pg.mkPen(pen_color))
-                    dot.setData([x], [y])
-                    self.plot_widget.addItem(dot)
-                    self.dots.append(dot)
-                    lines.append(f"<span style='color:{pen_color.name()};'>Ch{i+1}: {y:.2f}</span>")
-                    max_y = max(max_y, y)
+    def snap(self):
+        timestamps, _ = self.get_data()
+        index = self.find_index()
+        if 0 <= index < len(timestamps):
+            self.line.setValue(index)
 
-            self.text.setHtml(f"{self.label_prefix}: {timestamp}<br>X: {x}<br>" + '<br>'.join(lines))
-            self.text.setPos(x + 5, max_y)
+    def update_position(self):
+        timestamps, data = self.get_data()
+        x = self.find_index()
 
-            parent = self.plot_widget.parent()
-            if parent and hasattr(parent, 'update_time_difference'):
-                parent.update_time_difference()
+        if 0 <= x < len(timestamps):
+            values = data[:, x]
+            shown = (x, timestamps[x], values.tobytes())
+            if shown == self._shown:
+                return
+            self._shown = shown
+            self.index, self.timestamp = x, timestamps[x]
+
+            if len(self.brushes) != len(values):
+                self.brushes = [pg.mkBrush(pg.intColor(i)) for i in range(len(values))]
+                self.colors = [pg.intColor(i).name() for i in range(len(values))]
+            self.dots.setData(np.full(len(values), x), values, brush=self.brushes, pen=None)
+
+            lines = [f"<span style='color:{color};'>Ch{i+1}: {y:.2f}</span>"
+                     for i, (color, y) in enumerate(zip(self.colors, values.tolist()))]
+            self.text.setHtml(f"{self.label_prefix}: {format_timestamp(self.timestamp)}<br>X: {x}<br>"
+                              + '<br>'.join(lines))
+            self.text.setPos(x + 5, np.nanmax(values) if len(values) else 0)
+        elif self._shown is not None:
+            self._shown = None
+            self.index, self.timestamp = None, None
+            self.dots.clear()
+            self.text.setHtml("")
+        else:
+            return
 
         self.positionChanged.emit()
 
     def remove(self):
-        for item in [self.line, self.text] + self.dots:
+        for item in [self.line, self.text, self.dots]:
             self.plot_widget.removeItem(item)
 
     def get_time(self):
-        x = int(self.line.value())
-        _, _, timestamps = self.get_data()
-        if 0 <= x < len(timestamps):
-            return timestamps[x]
+        return self.timestamp
+
+# Table view of the sample buffer. Cells are read and formatted only when the
+# view asks for them, so opening the table costs O(visible rows). refresh()
+# picks up new samples while capturing.
+class SampleTableModel(QAbstractTableModel):
+    def __init__(self, get_data_callback):
+        super().__init__()
+        self.get_data = get_data_callback
+        self.times, self.values = self.get_data()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.times)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.values.shape[0] + 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        if row >= len(self.times):
+            return None
+        if column == 0:
+            return format_timestamp(self.times[row])
+        return str(self.values[column - 1, row])
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Vertical:
+            return str(section + 1)
+        return "Timestamp" if section == 0 else f"Ch{section}"
+
+    def refresh(self):
+        times, data = self.get_data()
+        if data.shape[0] != self.values.shape[0] or len(times) < len(self.times):
+            self.beginResetModel()
+            self.times, self.values = times, data
+            self.endResetModel()
+            return
+        if len(times) > len(self.times):
+            self.beginInsertRows(QModelIndex(), len(self.times), len(times) - 1)
+            self.times, self.values = times, data
+            self.endInsertRows()
+        else:
+            self.times, self.values = times, data
+        # a full ring scrolls in place, every row may have changed
+        if len(times):
+            self.dataChanged.emit(self.index(0, 0), self.index(len(times) - 1, data.shape[0]))
+
+
+CLOCK_DIGITS = [0, 1, 3, 4, 6, 7, 9, 10, 11, 12, 13, 14]
+CLOCK_WEIGHTS = np.array([36000000000, 3600000000, 600000000, 60000000, 10000000, 1000000,
+                          100000, 10000, 1000, 100, 10, 1], dtype=np.int64)
+
+def parse_times(column):
+    # "HH:MM:SS.ffffff" as written by CsvLogFormat (or "HH:MM:SS.mmm" from older
+    # logs) is decoded digit by digit in numpy; anything else goes through
+    # pandas. Clock times are put on today.
+    raw = np.asarray(column, dtype='S16').view(np.uint8).reshape(-1, 16)
+    for width in (15, 12):
+        digits = raw[:, CLOCK_DIGITS[:width - 3]].astype(np.int64) - ord('0')
+        if ((raw[:, width:] == 0).all() and (raw[:, [2, 5]] == ord(':')).all() and (raw[:, 8] == ord('.')).all()
+                and ((digits >= 0) & (digits <= 9)).all()):
+            today = np.datetime64(datetime.now().date(), 'us').astype(np.int64)
+            return today + digits @ CLOCK_WEIGHTS[:width - 3]
+    return pd.to_datetime(column).to_numpy().astype('datetime64[us]').astype(np.int64)
+
+def read_csv_header(file_name):
+    # the column names if the first line is a header rather than a sample
+    with open(file_name, 'rb') as f:
+        first = next(csv.reader([f.readline().decode(errors='replace').strip()]), [''])
+    try:
+        pd.to_datetime(first[0])
         return None
+    except (ValueError, OverflowError):
+        return first
+
+def count_lines(file_name, block_size=16 << 20):
+    lines = 0
+    last = b'\n'
+    with open(file_name, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            lines += block.count(b'\n')
+            last = block[-1:]
+    return lines + (last != b'\n')
+
+# Column store a CSV capture is converted into so it can be opened with np.memmap:
+# a 64 byte header (b'SPLC', version, channels, capacity, rows, source size and
+# mtime) followed by capacity int64 microsecond timestamps and a channels x
+# capacity float64 block. The CSV is read once in chunks; the cache next to it is
+# reused while the source size and mtime are unchanged. It has the view(),
+# channels and total of a RingBuffer so it can be plotted directly.
+class CaptureCache:
+    extension = '.cache'
+    magic = b'SPLC'
+    version = 1
+    header = struct.Struct('<4sHHqqqq')
+    header_size = 64
+
+    def __init__(self, file_name):
+        with open(file_name, 'rb') as f:
+            fields = self.header.unpack(f.read(self.header.size))
+        magic, version, self.channels, capacity, rows, self.source_size, self.source_mtime = fields
+        self.channel_names = None
+        if magic != self.magic or version != self.version:
+            raise ValueError(f"{file_name} is not a capture cache")
+        self.total = rows
+        if rows == 0:
+            self.times = np.empty(0, dtype='datetime64[us]')
+            self.data = np.empty((self.channels, 0))
+            return
+        self.times = np.memmap(file_name, dtype='<i8', mode='r', offset=self.header_size,
+                               shape=(rows,)).view('datetime64[us]')
+        self.data = np.memmap(file_name, dtype='<f8', mode='r', offset=self.header_size + 8 * capacity,
+                              shape=(self.channels, capacity))[:, :rows]
+
+    def __len__(self):
+        return self.total
+
+    def view(self):
+        return self.times, self.data
+
+    @classmethod
+    def open(cls, source, chunk_rows=500000, progress=None):
+        stat = os.stat(source)
+        file_name = source + cls.extension
+        header = read_csv_header(source)
+        try:
+            cache = cls(file_name)
+            if (cache.source_size, cache.source_mtime) != (stat.st_size, stat.st_mtime_ns):
+                # release the old mapping before the file is replaced
+                del cache
+                cache = None
+        except (OSError, ValueError, struct.error):
+            cache = None
+        if cache is None:
+            cls.convert(source, file_name, stat, chunk_rows, header, progress)
+            cache = cls(file_name)
+        if header and len(header) == cache.channels + 1:
+            cache.channel_names = header[1:]
+        return cache
+
+    @classmethod
+    def convert(cls, source, file_name, stat, chunk_rows, header=None, progress=None):
+        header = None if header is None else 0
+        capacity = count_lines(source) - (header is not None)
+
+        # written under a temporary name so a cancelled conversion is never reused
+        temp_name = file_name + '.tmp'
+        times = data = None
+        rows = 0
+        try:
+            try:
+                for chunk in pd.read_csv(source, header=header, chunksize=chunk_rows):
+                    if times is None:
+                        channels = chunk.shape[1] - 1
+                        with open(temp_name, 'wb') as f:
+                            f.truncate(cls.header_size + 8 * capacity * (channels + 1))
+                        times = np.memmap(temp_name, dtype='<i8', mode='r+', offset=cls.header_size,
+                                          shape=(capacity,))
+                        data = np.memmap(temp_name, dtype='<f8', mode='r+',
+                                         offset=cls.header_size + 8 * capacity, shape=(channels, capacity))
+                    n = len(chunk)
+                    times[rows:rows + n] = parse_times(chunk.iloc[:, 0])
+                    data[:, rows:rows + n] = chunk.iloc[:, 1:].to_numpy(dtype=np.float64).T
+                    rows += n
+                    if progress:
+                        progress(rows, capacity)
+                if times is None:
+                    raise ValueError(f"{source} holds no samples")
+                times.flush()
+                data.flush()
+            finally:
+                # the mappings must be released before the file is replaced or removed
+                del times, data
+            with open(temp_name, 'r+b') as f:
+                f.write(cls.header.pack(cls.magic, cls.version, channels, capacity, rows,
+                                        stat.st_size, stat.st_mtime_ns))
+            os.replace(temp_name, file_name)
+        finally:
+            if os.path.exists(temp_name):
+                os.remove(temp_name)
+
+# Times (1-D) or data (channels x samples) of a SegmentedCapture addressed by
+# global sample number, for the cursors and the table. Indexing opens only the
+# segments the index or slice touches.
+class SegmentedColumns:
+    def __init__(self, capture, field):
+        self.capture = capture
+        self.field = field
+
+    @property
+    def shape(self):
+        if self.field == 'times':
+            return (self.capture.total,)
+        return (self.capture.channels, self.capture.total)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        rows = None
+        if self.field == 'data':
+            rows, key = key
+        total = self.capture.total
+        if isinstance(key, slice):
+            start, stop, step = key.indices(total)
+            if step != 1:
+                raise IndexError("segmented captures only support contiguous slices")
+            result = self.capture.read(self.field, start, max(stop, start))
+        else:
+            key = int(key) + (total if key < 0 else 0)
+            if not 0 <= key < total:
+                raise IndexError(f"sample {key} out of range")
+            result = self.capture.read(self.field, key, key + 1)
+            result = result[0] if self.field == 'times' else result[:, 0]
+        return result if rows is None else result[rows]
+
+# A segmented log opened through its index file as one dataset. Sample numbers
+# run across all segments; a segment is memory mapped (CSV segments through
+# their CaptureCache) only when a window, cursor or table row reaches into it,
+# and at most max_open stay open. A view spanning more than max_segments
+# segments is drawn from the min/max stored in the index without opening any.
+# window() has the signature of MinMaxPyramid.window so it plots the same way.
+class SegmentedCapture:
+    def __init__(self, index_name, max_segments=4, max_open=8, progress=None):
+        with open(index_name) as f:
+            index = json.load(f)
+        self.directory = os.path.dirname(index_name)
+        self.channels = index['channels']
+        self.channel_names = index.get('channel_names')
+        if self.channel_names and len(self.channel_names) != self.channels:
+            self.channel_names = None
+        self.segments = [entry for entry in index['segments'] if entry['samples'] > 0]
+        if not self.segments:
+            raise ValueError(f"{index_name} lists no samples")
+        self.offsets = np.concatenate([[0], np.cumsum([entry['samples'] for entry in self.segments])])
+        self.total = int(self.offsets[-1])
+        self.mins = np.array([entry['min'] for entry in self.segments], dtype=np.float64).T
+        self.maxs = np.array([entry['max'] for entry in self.segments], dtype=np.float64).T
+        self.max_segments = max_segments
+        self.max_open = max_open
+        self.progress = progress
+        self._open = OrderedDict()
+
+    def __len__(self):
+        return self.total
+
+    def view(self):
+        return SegmentedColumns(self, 'times'), SegmentedColumns(self, 'data')
+
+    def locate(self, x):
+        return int(np.searchsorted(self.offsets, x, side='right')) - 1
+
+    def _segment(self, i):
+        if i in self._open:
+            self._open.move_to_end(i)
+            return self._open[i]
+        entry = self.segments[i]
+        file_name = os.path.join(self.directory, entry['file'])
+        rows = entry['samples']
+        extension = os.path.splitext(file_name)[1].lower()
+        source = None
+        if extension == '.npy':
+            # mapped from the header's dtype, the row count in the header is 0 if the log was not closed
+            with open(file_name, 'rb') as f:
+                np.lib.format.read_magic(f)
+                _, _, dtype = np.lib.format.read_array_header_1_0(f)
+                offset = f.tell()
+            records = np.memmap(file_name, dtype=dtype, mode='r', offset=offset, shape=(rows,))
+            times, data = records['time'], records['values'].T
+        elif extension == BinLogFormat.extension:
+            _, _, offset = BinLogFormat.read_header(file_name)
+            dtype = np.dtype([('time', '<i8'), ('values', '<f8', (self.channels,))])
+            records = np.memmap(file_name, dtype=dtype, mode='r', offset=offset, shape=(rows,))
+            times, data = records['time'].view('datetime64[us]'), records['values'].T
+        else:
+            source = CaptureCache.open(file_name, progress=self.progress)
+            times, data = source.view()
+            times, data = times[:rows], data[:, :rows]
+        # CSV segments only hold the clock time; put them back on the day the index gives
+        shift = np.datetime64(entry['start'][:10], 'D') - times[0].astype('datetime64[D]')
+        segment = {'times': times, 'data': data, 'shift': shift.astype('timedelta64[us]'),
+                   'pyramid': None, 'source': source}
+        self._open[i] = segment
+        while len(self._open) > self.max_open:
+            self._open.popitem(last=False)
+        return segment
+
+    def read(self, field, start, stop):
+        # samples start <= i < stop of one field as a plain array
+        parts = []
+        i = self.locate(start)
+        while start < stop and i < len(self.segments) and self.offsets[i] < stop:
+            segment = self._segment(i)
+            first, last = max(start, self.offsets[i]) - self.offsets[i], min(stop, self.offsets[i + 1]) - self.offsets[i]
+            if field == 'times':
+                parts.append(segment['times'][first:last] + segment['shift'])
+            else:
+                parts.append(segment['data'][:, first:last])
+            i += 1
+        if not parts:
+            if field == 'times':
+                return np.empty(0, dtype='datetime64[us]')
+            return np.empty((self.channels, 0))
+        return np.concatenate(parts, axis=-1)
+
+    def window(self, data, x0, x1, width):
+        x0, x1 = max(x0, 0), min(x1, self.total)
+        if x1 <= x0:
+            return np.empty(0), np.empty((self.channels, 0))
+        first, last = self.locate(x0), self.locate(x1 - 1) + 1
+        if last - first > self.max_segments:
+            starts, ends = self.offsets[first:last], self.offsets[first + 1:last + 1]
+            x = np.repeat((starts + ends - 1) / 2, 2)
+            y = np.stack([self.mins[:, first:last], self.maxs[:, first:last]], axis=2).reshape(self.channels, -1)
+            return x, y
+
+        xs, ys = [], []
+        for i in range(first, last):
+            segment = self._segment(i)
+            if segment['pyramid'] is None:
+                segment['pyramid'] = MinMaxPyramid.build(segment['data'])
+            offset = self.offsets[i]
+            start, stop = max(x0, offset), min(x1, self.offsets[i + 1])
+            x, y = segment['pyramid'].window(segment['data'], start - offset, stop - offset,
+                                             max(int(width * (stop - start) / (x1 - x0)), 1))
+            xs.append(x + offset)
+            ys.append(y)
+        return np.concatenate(xs), np.concatenate(ys, axis=1)
 
 class SerialPlotter(QMainWindow):
     def __init__(self):
@@ -86,34 +768,67 @@ class SerialPlotter(QMainWindow):
         self.setWindowTitle("Mohammed Adel Alshreif (MLS)")
         self.resize(1000, 700)
 
-        self.update_every_n = 10  # أضف هذا السطر هنا قبل init_ui
+        self.target_fps = 30
 
-        self.serial = None
-        self.csv_writer = None
-        self.csv_file = None
+        self.engine = None
+        self.extra_ports = []
         self.reading = False
-        self.csv_filename = None
-
-        self.time_stamps = []
-        self.y_data_channels = []
+        self.log_filename = None
+
+        self.buffer = None
+        self.decimator = MinMaxDecimator()
+        self.pyramid = None
+        self.stats = None
+        self.channel_stats = None
+        self.next_legend_update = 0.0
+        self.held = None
+        # trigger settings, and the last capture (times, data, pyramid) shown instead of the live ring
+        self.trigger_config = {
+            'mode': "Off", 'channel': 1, 'edge': 'rising', 'level': 0.0, 'hysteresis': 0.0,
+            'holdoff': 0.0, 'pre': 500, 'post': 500, 'save_only': False,
+        }
+        self.capture = None
+        self.trigger_line = None
         self.max_samples = 1000
+        self.frame_config = {
+            'sync': 'AA55', 'channels': 4, 'dtype': 'int16',
+            'byteorder': '<', 'checksum': 'none',
+        }
 
         self.cursor1 = None
         self.cursor2 = None
 
         self.legend_items = []
         self.curve_visibility = []
+        self.channel_names = []
 
         self.init_ui()
         self.refresh_ports()
 
         self.timer = QTimer()
+        self.timer.setTimerType(Qt.PreciseTimer)
         self.timer.timeout.connect(self.update_plot)
-        self.update_counter = 0  # أضف هذا المتغير
-        self.update_every_n = 10  # حدث الرسم كل 10 عينات فقط
+        self.pending_samples = 0
+        self.next_frame = 0.0
+        self.frame_times = deque()
+        self.render_time = 0.0
+        self.skipped_frames = 0
+
+        self.filter = None
+        self.filter_config = {'type': "None", 'length': 16, 'cutoff': 10.0, 'rate': 0.0}
+        self.spectrum = None
+        self.spectrum_lines = []
+
+        self.metrics = Metrics()
+        self.metrics_file = None
+        self.stats_view = None
+        self.metrics_timer = QTimer()
+        self.metrics_timer.timeout.connect(self.update_metrics)
 
     def init_ui(self):
         self.port_selector = QComboBox()
+        # editable so virtual sources like "replay:capture.csv,speed=10" can be typed in
+        self.port_selector.setEditable(True)
         # إضافة ComboBox للـ Baudrate
         self.baudrate_selector = QComboBox()
         baudrates = [
@@ -124,11 +839,11 @@ class SerialPlotter(QMainWindow):
             self.baudrate_selector.addItem(str(br))
         self.baudrate_selector.setCurrentText("115200")
 
-        # إضافة ComboBox لمعدل التحديث بقيم من 1 إلى 10 ثم 20, 30, ..., 100
+        # ComboBox لمعدل الرسم بالإطار في الثانية (FPS)
         self.update_rate_selector = QComboBox()
-        update_rates = [str(i) for i in range(1, 11)] + [str(i) for i in range(20, 101, 10)]
+        update_rates = [str(i) for i in [5, 10, 15, 20, 30, 60, 120]]
         self.update_rate_selector.addItems(update_rates)
-        self.update_rate_selector.setCurrentText(str(self.update_every_n))
+        self.update_rate_selector.setCurrentText(str(self.target_fps))
         self.update_rate_selector.currentTextChanged.connect(self.change_update_rate)
 
         # إضافة ComboBox لحجم العينات (max_samples)
@@ -137,8 +852,25 @@ class SerialPlotter(QMainWindow):
         self.max_samples_selector.addItems(max_samples_options)
         self.max_samples_selector.setCurrentText(str(self.max_samples))
         self.max_samples_selector.currentTextChanged.connect(self.change_max_samples)
+        # live view range from the running channel statistics, off once the user zooms or pans
+        self.auto_range_checkbox = QCheckBox("Auto Range")
+        self.auto_range_checkbox.setChecked(True)
+
+        self.format_selector = QComboBox()
+        self.format_selector.addItems(["ASCII CSV", "Binary Frames"])
+        self.frame_setup_button = QPushButton("⚙️ Frame Setup")
+        self.frame_setup_button.clicked.connect(self.show_frame_setup)
+        # first column as device timestamps instead of host read times
+        self.time_source_selector = QComboBox()
+        self.time_source_selector.addItems(list(TIME_SOURCES))
+        # split long captures into indexed segments
+        self.rotation_selector = QComboBox()
+        self.rotation_selector.addItems(list(LOG_ROTATIONS))
 
         self.refresh_button = QPushButton("🔄 Refresh Ports")
+        self.add_port_button = QPushButton("➕ Add Port")
+        self.clear_ports_button = QPushButton("✖️ Clear Ports")
+        self.ports_label = QLabel("")
         self.start_button = QPushButton("▶️ Start")
         self.stop_button = QPushButton("⏹️ Stop")
         self.save_button = QPushButton("💾 Save Plot")
@@ -146,10 +878,19 @@ class SerialPlotter(QMainWindow):
         self.open_img_button = QPushButton("🖼️ Open Image")
         self.show_table_button = QPushButton("📊 Show Table")
         self.reset_cursors_button = QPushButton("🧹 Reset Cursors")
+        self.stats_button = QPushButton("📈 Stats")
+        self.filter_button = QPushButton("🎛️ Filter")
+        self.spectrum_button = QPushButton("📶 Spectrum")
+        self.trigger_button = QPushButton("🎯 Trigger")
+        self.export_metrics_checkbox = QCheckBox("Export Metrics")
+        self.metrics_label = QLabel("")
         self.status_label = QLabel("Status: MLS")
-        self.delta_label = QLabel("Δt = 0.000 sec")
+        self.fps_label = QLabel("")
+        self.delta_label = QLabel("Δt = 0.000000 sec")
 
         self.refresh_button.clicked.connect(self.refresh_ports)
+        self.add_port_button.clicked.connect(self.add_port)
+        self.clear_ports_button.clicked.connect(self.clear_ports)
         self.start_button.clicked.connect(self.start_plotting)
         self.stop_button.clicked.connect(self.stop_plotting)
         self.save_button.clicked.connect(self.save_plot_image)
@@ -157,16 +898,27 @@ class SerialPlotter(QMainWindow):
         self.open_img_button.clicked.connect(self.open_plot_image)
         self.show_table_button.clicked.connect(self.show_data_table)
         self.reset_cursors_button.clicked.connect(self.reset_cursors)
+        self.stats_button.clicked.connect(self.show_stats)
+        self.filter_button.clicked.connect(self.show_filter_setup)
+        self.spectrum_button.clicked.connect(self.show_spectrum)
+        self.trigger_button.clicked.connect(self.show_trigger_setup)
 
         top_layout = QHBoxLayout()
         for widget in [
             QLabel("COM Port:"), self.port_selector, self.refresh_button,
             QLabel("Baudrate:"), self.baudrate_selector,
-            QLabel("Update Rate:"), self.update_rate_selector,
+            self.add_port_button, self.clear_ports_button,
+            QLabel("Target FPS:"), self.update_rate_selector,
             QLabel("Max Samples:"), self.max_samples_selector,  # أضف هذا السطر
+            self.auto_range_checkbox,
+            QLabel("Format:"), self.format_selector, self.frame_setup_button,
+            QLabel("Timestamps:"), self.time_source_selector,
+            QLabel("Log Rotation:"), self.rotation_selector,
             self.start_button, self.stop_button, self.save_button,
             self.load_csv_button, self.open_img_button,
-            self.show_table_button, self.reset_cursors_button
+            self.show_table_button, self.reset_cursors_button,
+            self.filter_button, self.spectrum_button, self.trigger_button,
+            self.stats_button, self.export_metrics_checkbox
         ]:
             top_layout.addWidget(widget)
 
@@ -176,6 +928,8 @@ class SerialPlotter(QMainWindow):
         self.plot_widget.showGrid(x=True, y=True)
         self.plot_widget.setMouseEnabled(x=True, y=True)
         self.plot_widget.scene().sigMouseClicked.connect(self.add_cursor_on_click)
+        self.plot_widget.plotItem.vb.sigXRangeChanged.connect(self.on_view_range_changed)
+        self.plot_widget.plotItem.vb.sigRangeChangedManually.connect(self.on_manual_range)
 
         self.plot_lines = []
         self.legend = self.plot_widget.addLegend()
@@ -184,6 +938,7 @@ class SerialPlotter(QMainWindow):
 
         layout = QVBoxLayout()
         layout.addLayout(top_layout)
+        layout.addWidget(self.ports_label)
         layout.addWidget(self.status_label)
         layout.addWidget(self.delta_label)
         layout.addWidget(self.plot_widget)
@@ -191,39 +946,77 @@ class SerialPlotter(QMainWindow):
         container = QWidget()
         container.setLayout(layout)
         self.setCentralWidget(container)
+        self.statusBar().addPermanentWidget(self.metrics_label)
+        self.statusBar().addPermanentWidget(self.fps_label)
 
     def refresh_ports(self):
         ports = serial.tools.list_ports.comports()
         self.port_selector.clear()
         for port in ports:
             self.port_selector.addItem(port.device)
+        self.port_selector.addItem("sim:rate=1000,channels=4")
+
+    # Ports added with "Add Port" are read together with the one selected above,
+    # each at its own baudrate.
+    def add_port(self):
+        port = self.port_selector.currentText()
+        if not port:
+            return
+        self.extra_ports = [p for p in self.extra_ports if p[0] != port]
+        self.extra_ports.append((port, int(self.baudrate_selector.currentText())))
+        self.update_ports_label()
+
+    def clear_ports(self):
+        self.extra_ports = []
+        self.update_ports_label()
+
+    def update_ports_label(self):
+        ports = ", ".join(f"{port} @ {baudrate}" for port, baudrate in self.extra_ports)
+        self.ports_label.setText(f"Also reading: {ports}" if ports else "")
+
+    def selected_ports(self):
+        port = self.port_selector.currentText()
+        ports = [(port, int(self.baudrate_selector.currentText()))] if port else []
+        return ports + [p for p in self.extra_ports if p[0] != port]
 
     def start_plotting(self):
         self.reset_cursors()
-        selected_port = self.port_selector.currentText()
         # الحصول على قيمة البودريت المختارة
-        selected_baudrate = int(self.baudrate_selector.currentText())
-        if not selected_port:
+        ports = self.selected_ports()
+        if not ports:
             self.status_label.setText("❌ No COM port selected.")
             return
 
         try:
-            self.csv_filename, _ = QFileDialog.getSaveFileName(
-                self, "Save CSV File",
+            self.log_filename, selected_filter = QFileDialog.getSaveFileName(
+                self, "Save Log File",
                 f"data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                "CSV Files (*.csv)"
+                "CSV Files (*.csv);;NumPy Files (*.npy);;Binary Records (*.bin)"
             )
-            if not self.csv_filename:
-                self.status_label.setText("⚠️ CSV save cancelled.")
+            if not self.log_filename:
+                self.status_label.setText("⚠️ Log save cancelled.")
                 return
+            if not os.path.splitext(self.log_filename)[1] and '*' in selected_filter:
+                self.log_filename += selected_filter[selected_filter.index('*') + 1:-1]
 
             # استخدم البودريت المختار هنا
-            self.serial = serial.Serial(selected_port, selected_baudrate, timeout=1)
-            self.csv_file = open(self.csv_filename, 'w', newline='')
-            self.csv_writer = csv.writer(self.csv_file)
-
-            self.time_stamps.clear()
-            self.y_data_channels.clear()
+            self.metrics = Metrics()
+            time_unit = TIME_SOURCES[self.time_source_selector.currentText()]
+            rotate_bytes, rotate_seconds = LOG_ROTATIONS[self.rotation_selector.currentText()]
+            trigger = self.create_trigger()
+            self.engine = AcquisitionEngine(ports, self.create_parser, self.log_filename,
+                                            DEVICE_TIME_SCALES.get(time_unit), rotate_bytes=rotate_bytes,
+                                            rotate_seconds=rotate_seconds, metrics=self.metrics, trigger=trigger,
+                                            trigger_only=trigger is not None and self.trigger_config['save_only'])
+            if self.export_metrics_checkbox.isChecked():
+                self.metrics_file = open(os.path.splitext(self.log_filename)[0] + '.metrics.jsonl', 'w')
+
+            self.buffer = None
+            self.pyramid = None
+            self.stats = None
+            self.channel_stats = None
+            self.capture = None
+            self.trigger_line = None
             self.plot_widget.clear()
             self.legend = self.plot_widget.addLegend()
             self.plot_lines.clear()
@@ -231,85 +1024,486 @@ class SerialPlotter(QMainWindow):
             self.curve_visibility.clear()
 
             self.reading = True
-            self.status_label.setText(f"✅ Reading from {selected_port}")
-            self.timer.start(5)
+            self.engine.start()
+            self.status_label.setText(f"✅ Reading from {', '.join(self.engine.ports.names)}"
+                                      + (", logging triggered captures only" if self.engine.trigger_only else ""))
+            self.pending_samples = 0
+            self.next_frame = 0.0
+            self.frame_times.clear()
+            self.skipped_frames = 0
+            self.timer.start(self.frame_interval_ms())
+            self.metrics_timer.start(1000)
         except Exception as e:
             self.status_label.setText(f"❌ Error: {str(e)}")
 
+    def create_parser(self):
+        if self.format_selector.currentText() != "Binary Frames":
+            return LineParser()
+        config = self.frame_config
+        return FrameParser(
+            config['channels'], config['dtype'], config['byteorder'],
+            bytes.fromhex(config['sync']), config['checksum']
+        )
+
+    def create_trigger(self, config=None):
+        config = config or self.trigger_config
+        if config['mode'] == "Off":
+            return None
+        return Trigger(config['channel'] - 1, config['level'], config['edge'], config['hysteresis'],
+                       config['holdoff'], config['pre'], config['post'], config['mode'].lower())
+
+    def show_trigger_setup(self):
+        config = self.trigger_config
+        dialog = QDialog(self)
+        dialog.setWindowTitle("🎯 Trigger")
+        layout = QFormLayout()
+        mode_selector = QComboBox()
+        mode_selector.addItems(["Off"] + [mode.capitalize() for mode in TRIGGER_MODES])
+        mode_selector.setCurrentText(config['mode'])
+        channel_spin = QSpinBox()
+        channel_spin.setRange(1, 256)
+        channel_spin.setValue(config['channel'])
+        edge_selector = QComboBox()
+        edge_selector.addItems(TRIGGER_EDGES)
+        edge_selector.setCurrentText(config['edge'])
+        level_edit = QLineEdit(str(config['level']))
+        hysteresis_edit = QLineEdit(str(config['hysteresis']))
+        holdoff_edit = QLineEdit(str(config['holdoff']))
+        pre_spin = QSpinBox()
+        pre_spin.setRange(0, 10000000)
+        pre_spin.setValue(config['pre'])
+        post_spin = QSpinBox()
+        post_spin.setRange(1, 10000000)
+        post_spin.setValue(config['post'])
+        save_only_checkbox = QCheckBox("Log triggered captures only (applies on Start)")
+        save_only_checkbox.setChecked(config['save_only'])
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        layout.addRow("Mode:", mode_selector)
+        layout.addRow("Channel:", channel_spin)
+        layout.addRow("Edge:", edge_selector)
+        layout.addRow("Level:", level_edit)
+        layout.addRow("Hysteresis:", hysteresis_edit)
+        layout.addRow("Holdoff (s):", holdoff_edit)
+        layout.addRow("Pre-trigger Samples:", pre_spin)
+        layout.addRow("Post-trigger Samples:", post_spin)
+        layout.addRow(save_only_checkbox)
+        layout.addRow(buttons)
+        dialog.setLayout(layout)
+        if not dialog.exec_():
+            return
+        try:
+            new_config = {
+                'mode': mode_selector.currentText(),
+                'channel': channel_spin.value(),
+                'edge': edge_selector.currentText(),
+                'level': float(level_edit.text()),
+                'hysteresis': float(hysteresis_edit.text()),
+                'holdoff': float(holdoff_edit.text()),
+                'pre': pre_spin.value(),
+                'post': post_spin.value(),
+                'save_only': save_only_checkbox.isChecked(),
+            }
+            if self.buffer is not None and new_config['channel'] > self.buffer.channels:
+                raise ValueError(f"channel {new_config['channel']} does not exist, "
+                                 f"the data has {self.buffer.channels} channels")
+            trigger = self.create_trigger(new_config)
+        except ValueError as e:
+            self.status_label.setText(f"⚠️ Invalid trigger: {str(e)}")
+            return
+        self.trigger_config = new_config
+        # applying the dialog re-arms the trigger, which also restarts a fired single capture
+        if self.engine:
+            self.engine.trigger = trigger
+        if trigger is None:
+            self.capture = None
+            if self.trigger_line is not None:
+                self.trigger_line.setVisible(False)
+            self.pending_samples += 1
+            self.status_label.setText("🎯 Trigger off")
+        else:
+            self.status_label.setText(
+                f"🎯 Trigger armed: {new_config['mode']}, {new_config['edge']} edge at {new_config['level']} "
+                f"on Ch{new_config['channel']}"
+            )
+
+    def show_capture(self, capture):
+        # freeze the display on a triggered capture; x is the sample number within it
+        times, values, index = capture
+        if len(self.engine.ports.readers) > 1:
+            values, _ = sample_and_hold(values, np.full((1, values.shape[1]), np.nan))
+        data = np.ascontiguousarray(values.T)
+        self.capture = (times, data, MinMaxPyramid.build(data))
+        if self.trigger_line is None:
+            self.trigger_line = pg.InfiniteLine(angle=90, movable=False,
+                                                pen=pg.mkPen('y', width=1, style=Qt.DashLine))
+            self.plot_widget.addItem(self.trigger_line)
+        self.trigger_line.setVisible(index is not None)
+        if index is not None:
+            self.trigger_line.setValue(index)
+        if self.auto_range_checkbox.isChecked():
+            vb = self.plot_widget.plotItem.vb
+            vb.setXRange(0, max(len(times) - 1, 1), padding=0.02)
+            visible = np.array([plot.isVisible() for plot in self.plot_lines], dtype=bool)
+            bounds = data[visible]
+            bounds = bounds[np.isfinite(bounds)]
+            if len(bounds):
+                vb.setYRange(bounds.min(), bounds.max(), padding=0.05)
+        trigger = self.engine.trigger
+        if index is None:
+            self.status_label.setText("🎯 Auto: no trigger")
+        elif trigger is not None and not trigger.armed:
+            self.status_label.setText(f"🎯 Triggered at {format_timestamp(times[index])} (single), "
+                                      f"apply the trigger settings again to re-arm")
+        else:
+            self.status_label.setText(f"🎯 Triggered at {format_timestamp(times[index])} "
+                                      f"(#{trigger.count if trigger else 0})")
+
+    def show_filter_setup(self):
+        dialog = QDialog(self)
+        dialog.setWindowTitle("🎛️ Display Filter")
+        layout = QFormLayout()
+        type_selector = QComboBox()
+        type_selector.addItems(FILTER_TYPES)
+        type_selector.setCurrentText(self.filter_config['type'])
+        length_spin = QSpinBox()
+        length_spin.setRange(1, 4096)
+        length_spin.setValue(self.filter_config['length'])
+        cutoff_edit = QLineEdit(str(self.filter_config['cutoff']))
+        rate = self.filter_config['rate'] or (estimate_rate(self.get_data()[0]) or 1000.0)
+        rate_edit = QLineEdit(f"{rate:.6g}")
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        layout.addRow("Filter:", type_selector)
+        layout.addRow("Length / Taps:", length_spin)
+        layout.addRow("Cutoff (Hz):", cutoff_edit)
+        layout.addRow("Sample Rate (Hz):", rate_edit)
+        layout.addRow(buttons)
+        dialog.setLayout(layout)
+        if not dialog.exec_():
+            return
+        try:
+            config = {
+                'type': type_selector.currentText(),
+                'length': length_spin.value(),
+                'cutoff': float(cutoff_edit.text()),
+                'rate': float(rate_edit.text()),
+            }
+            if config['type'] in ("FIR Low-pass", "IIR Low-pass", "IIR High-pass") and \
+                    not 0 < config['cutoff'] < config['rate'] / 2:
+                raise ValueError("cutoff must be between 0 and half the sample rate")
+            self.filter = make_filter(config['type'], config['rate'], config['cutoff'], config['length'])
+            self.filter_config = config
+            self.status_label.setText(f"🎛️ Display filter: {config['type']}")
+        except ValueError as e:
+            self.status_label.setText(f"⚠️ Invalid filter: {str(e)}")
+
+    def show_spectrum(self):
+        dialog = QDialog(self)
+        dialog.setWindowTitle("📶 Spectrum")
+        layout = QVBoxLayout()
+        options = QHBoxLayout()
+        size_selector = QComboBox()
+        size_selector.addItems([str(1 << i) for i in range(8, 17)])
+        size_selector.setCurrentText("1024")
+        averaging_selector = QComboBox()
+        averaging_selector.addItems(["0", "0.5", "0.8", "0.9", "0.95"])
+        averaging_selector.setCurrentText("0.5")
+        for widget in [QLabel("FFT Size:"), size_selector, QLabel("Averaging:"), averaging_selector]:
+            options.addWidget(widget)
+        plot_widget = pg.PlotWidget()
+        plot_widget.setLabel('left', 'Power', units='dB')
+        plot_widget.setLabel('bottom', 'Frequency', units='Hz')
+        plot_widget.showGrid(x=True, y=True)
+        plot_widget.addLegend()
+        layout.addLayout(options)
+        layout.addWidget(plot_widget)
+        dialog.setLayout(layout)
+        dialog.resize(800, 400)
+
+        def configure():
+            self.spectrum = Spectrum(int(size_selector.currentText()), float(averaging_selector.currentText()))
+            self.render_spectrum()
+
+        def close():
+            self.spectrum = None
+            self.spectrum_lines = []
+
+        self.spectrum_plot = plot_widget
+        self.spectrum_lines = []
+        size_selector.currentTextChanged.connect(configure)
+        averaging_selector.currentTextChanged.connect(configure)
+        dialog.finished.connect(close)
+        configure()
+        dialog.show()
+
+    def render_spectrum(self):
+        if self.buffer is None:
+            return
+        result = self.spectrum.update(*self.buffer.view())
+        if result is None:
+            return
+        freqs, power = result
+        if len(self.spectrum_lines) != len(power):
+            self.spectrum_plot.clear()
+            self.spectrum_lines = [
+                self.spectrum_plot.plot(pen=pg.mkPen(color=pg.intColor(i), width=1),
+                                        name=self.channel_names[i] if i < len(self.channel_names) else f"Channel {i+1}")
+                for i in range(len(power))
+            ]
+        for line, row in zip(self.spectrum_lines, power):
+            line.setData(freqs, row)
+
+    def show_frame_setup(self):
+        dialog = QDialog(self)
+        dialog.setWindowTitle("⚙️ Binary Frame Setup")
+        layout = QFormLayout()
+        sync_edit = QLineEdit(self.frame_config['sync'])
+        channels_spin = QSpinBox()
+        channels_spin.setRange(1, 64)
+        channels_spin.setValue(self.frame_config['channels'])
+        dtype_selector = QComboBox()
+        dtype_selector.addItems(['int8', 'uint8', 'int16', 'uint16', 'int32', 'uint32', 'float32', 'float64'])
+        dtype_selector.setCurrentText(self.frame_config['dtype'])
+        byteorder_selector = QComboBox()
+        byteorder_selector.addItems(["Little Endian", "Big Endian"])
+        byteorder_selector.setCurrentIndex(0 if self.frame_config['byteorder'] == '<' else 1)
+        checksum_selector = QComboBox()
+        checksum_selector.addItems(list(CHECKSUM_SIZES))
+        checksum_selector.setCurrentText(self.frame_config['checksum'])
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        layout.addRow("Sync Header (hex):", sync_edit)
+        layout.addRow("Channels:", channels_spin)
+        layout.addRow("Data Type:", dtype_selector)
+        layout.addRow("Byte Order:", byteorder_selector)
+        layout.addRow("Checksum:", checksum_selector)
+        layout.addRow(buttons)
+        dialog.setLayout(layout)
+        if not dialog.exec_():
+            return
+        try:
+            sync = sync_edit.text().replace(' ', '')
+            if not bytes.fromhex(sync):
+                raise ValueError("sync header must not be empty")
+            self.frame_config = {
+                'sync': sync.upper(),
+                'channels': channels_spin.value(),
+                'dtype': dtype_selector.currentText(),
+                'byteorder': '<' if byteorder_selector.currentIndex() == 0 else '>',
+                'checksum': checksum_selector.currentText(),
+            }
+            self.format_selector.setCurrentText("Binary Frames")
+            self.status_label.setText(
+                f"⚙️ Frame: sync {self.frame_config['sync']}, "
+                f"{self.frame_config['channels']} x {self.frame_config['dtype']}, "
+                f"checksum {self.frame_config['checksum']}"
+            )
+        except ValueError as e:
+            self.status_label.setText(f"⚠️ Invalid frame setup: {str(e)}")
+
     def stop_plotting(self):
         self.reading = False
         self.timer.stop()
-        if self.serial:
-            self.serial.close()
-            self.serial = None
-        if self.csv_file:
-            self.csv_file.close()
-            self.csv_file = None
-        self.status_label.setText("🛑 Stopped.")
+        self.metrics_timer.stop()
+        stats = None
+        if self.engine:
+            self.engine.stop()
+            self.update_plot(force=True)
+            self.engine.close()
+            stats = self.engine.stats_text()
+            self.engine = None
+        if self.metrics_file:
+            self.update_metrics()
+            self.metrics_file.close()
+            self.metrics_file = None
+        self.status_label.setText(f"🛑 Stopped. {stats}" if stats else "🛑 Stopped.")
         self.update_time_difference()
 
-    def update_plot(self):
-        if not self.reading or not self.serial:
+    def frame_interval_ms(self):
+        return max(1, round(1000 / self.target_fps))
+
+    # Called once per display frame: all samples received since the previous
+    # frame are drained and drawn together. If drawing takes longer than the
+    # frame budget, the following frames are skipped until it has caught up.
+    def update_plot(self, force=False):
+        if not self.engine or not (self.reading or force):
             return
 
         try:
-            updated = False
-            while self.serial.in_waiting:
-                line = self.serial.readline().decode(errors='ignore').strip()
-                if not line:
-                    continue
-                try:
-                    values = [float(v) for v in line.split(',')]
-                    now = datetime.now()
-                    timestamp = now.strftime('%H:%M:%S.%f')[:-3]
-                    self.csv_writer.writerow([timestamp] + values)
-
-                    if not self.y_data_channels:
-                        for _ in range(len(values)):
-                            self.y_data_channels.append([])
-                            pen = pg.mkPen(color=pg.intColor(len(self.plot_lines)), width=2)
-                            plot = self.plot_widget.plot(pen=pen, name=f"Channel {len(self.plot_lines)+1}")
-                            self.plot_lines.append(plot)
-                            self.curve_visibility.append(True)
-                        self._refresh_legend_clickable()
-
-                    self.time_stamps.append(now)
-                    for i, value in enumerate(values):
-                        self.y_data_channels[i].append(value)
-                        if len(self.y_data_channels[i]) > self.max_samples:
-                            self.y_data_channels[i] = self.y_data_channels[i][-self.max_samples:]
-
-                    if len(self.time_stamps) > self.max_samples:
-                        self.time_stamps = self.time_stamps[-self.max_samples:]
-
-                    self.update_counter += 1
-                    if self.update_counter >= self.update_every_n:
-                        for i, plot in enumerate(self.plot_lines):
-                            plot.setData(list(range(len(self.y_data_channels[i]))), self.y_data_channels[i])
-                        self.update_counter = 0
-                        updated = True
-
-                    if self.cursor1:
-                        self.cursor1.update_position()
-                    if self.cursor2:
-                        self.cursor2.update_position()
-                        self.update_time_difference()
-
-                except:
-                    continue
-            if updated:
-                QApplication.processEvents()
+            started = time.perf_counter_ns()
+            for times, values in self.engine.poll():
+                self.pending_samples += self.add_samples(times, values)
+            if self.engine.captures:
+                self.show_capture(self.engine.captures[-1])
+            if self.engine.trigger_error:
+                # only the trigger is turned off, the capture and its log go on
+                self.status_label.setText(f"⚠️ Trigger off: {self.engine.trigger_error}")
+                self.engine.trigger_error = None
+                self.trigger_config['mode'] = "Off"
+            self.metrics.timing('drain', time.perf_counter_ns() - started)
+            ports = self.engine.ports
+            if self.buffer is None and len(ports.readers) > 1 and ports.waiting_for():
+                self.status_label.setText(f"⏳ Waiting for data from {', '.join(ports.waiting_for())}")
+
+            now = time.perf_counter()
+            if self.pending_samples and now < self.next_frame and not force:
+                self.skipped_frames += 1
+                self.metrics.count('skipped_frames')
+            elif self.pending_samples or force:
+                self.pending_samples = 0
+                started = time.perf_counter_ns()
+                self.render_plot()
+                self.metrics.timing('render', time.perf_counter_ns() - started)
+                self.metrics.count('frames')
+                if self.spectrum is not None:
+                    started = time.perf_counter_ns()
+                    self.render_spectrum()
+                    self.metrics.timing('spectrum', time.perf_counter_ns() - started)
+                if self.cursor1:
+                    self.cursor1.update_position()
+                if self.cursor2:
+                    self.cursor2.update_position()
+                self.render_time = time.perf_counter() - now
+                self.next_frame = now + max(self.frame_interval_ms() / 1000, self.render_time) * 0.9
+                self.update_frame_stats(now)
+
+            if self.reading and self.engine.error:
+                error = self.engine.error
+                self.stop_plotting()
+                self.status_label.setText(f"⚠️ Error: {error}")
         except Exception as e:
             self.status_label.setText(f"⚠️ Error: {str(e)}")
 
+    # Once a second: summary in the status bar, full numbers in the stats panel
+    # and one JSON line per second in the metrics file when exporting.
+    def update_metrics(self):
+        snapshot = self.metrics.snapshot()
+        self.metrics_label.setText(format_metrics_summary(snapshot))
+        if self.stats_view is not None:
+            self.stats_view.setPlainText(format_metrics(snapshot))
+        if self.metrics_file:
+            self.metrics_file.write(json.dumps(snapshot) + '\n')
+            self.metrics_file.flush()
+
+    def show_stats(self):
+        dialog = QDialog(self)
+        dialog.setWindowTitle("📈 Stats")
+        layout = QVBoxLayout()
+        self.stats_view = QPlainTextEdit()
+        self.stats_view.setReadOnly(True)
+        self.stats_view.setStyleSheet("font-family: monospace;")
+        self.stats_view.setPlainText(format_metrics(self.metrics.snapshot()))
+        layout.addWidget(self.stats_view)
+        dialog.setLayout(layout)
+        dialog.resize(600, 500)
+        dialog.finished.connect(self.close_stats)
+        dialog.show()
+
+    def close_stats(self):
+        self.stats_view = None
+
+    def update_frame_stats(self, now):
+        self.frame_times.append(now)
+        while self.frame_times and now - self.frame_times[0] > 1.0:
+            self.frame_times.popleft()
+        self.fps_label.setText(
+            f"{len(self.frame_times)} FPS, render {self.render_time * 1000:.1f} ms, "
+            f"skipped {self.skipped_frames}"
+        )
+
+    def render_plot(self):
+        if not self.buffer:
+            return
+        _, data = self.buffer.view()
+        width = max(int(self.plot_widget.plotItem.vb.width()), 100)
+        if self.capture is not None:
+            _, capture_data, pyramid = self.capture
+            x0, x1 = self.plot_widget.plotItem.vb.viewRange()[0]
+            x, y = pyramid.window(capture_data, int(np.floor(x0)), int(np.ceil(x1)) + 1, width)
+        elif self.pyramid is not None:
+            x0, x1 = self.plot_widget.plotItem.vb.viewRange()[0]
+            x, y = self.pyramid.window(data, int(np.floor(x0)), int(np.ceil(x1)) + 1, width)
+        else:
+            x, y = self.decimator.decimate(data, self.buffer.total, width)
+        for i, plot in enumerate(self.plot_lines):
+            plot.setData(x, y[i])
+        if self.stats is not None:
+            self.channel_stats = self.stats.compute(data)
+            if self.auto_range_checkbox.isChecked() and self.capture is None:
+                self.apply_auto_range()
+            now = time.monotonic()
+            if now >= self.next_legend_update:
+                self.next_legend_update = now + 0.25
+                self.update_legend_stats()
+
+    def apply_auto_range(self):
+        # bounds of the visible channels from the running stats, not from the curve points
+        if self.channel_stats is None:
+            return
+        mins, maxs = self.channel_stats[:2]
+        visible = np.array([plot.isVisible() for plot in self.plot_lines], dtype=bool)
+        bounds = np.concatenate([mins[visible], maxs[visible]])
+        bounds = bounds[np.isfinite(bounds)]
+        vb = self.plot_widget.plotItem.vb
+        # the decimator draws the ring at x = 0 .. len - 1
+        vb.setXRange(0, max(len(self.buffer) - 1, 1), padding=0.02)
+        if len(bounds):
+            vb.setYRange(bounds.min(), bounds.max(), padding=0.05)
+
+    def on_manual_range(self, mask):
+        if any(mask):
+            self.auto_range_checkbox.setChecked(False)
+
+    def on_view_range_changed(self):
+        # loaded captures only draw the visible window, so zoom and pan redraw it
+        if self.pyramid is not None and not self.reading:
+            self.render_plot()
+
+    def add_samples(self, times, values):
+        if self.buffer is None:
+            channels = values.shape[1]
+            self.buffer = RingBuffer(channels, self.max_samples)
+            self.stats = WindowStats(channels, self.max_samples)
+            # a fresh filter, so no state from the previous capture or channel count is carried over
+            config = self.filter_config
+            self.filter = make_filter(config['type'], config['rate'], config['cutoff'], config['length'])
+            self.decimator.reset()
+            self.held = np.full((1, channels), np.nan)
+            self.channel_names = self.engine.ports.channel_names()
+            for _ in range(channels):
+                pen = pg.mkPen(color=pg.intColor(len(self.plot_lines)), width=2)
+                plot = self.plot_widget.plot(pen=pen, name=self.channel_names[len(self.plot_lines)])
+                self.plot_lines.append(plot)
+                self.curve_visibility.append(True)
+            self._refresh_legend_clickable()
+
+        # the log already has the raw values, only the display is held and filtered
+        if len(self.engine.ports.readers) > 1:
+            values, self.held = sample_and_hold(values, self.held)
+        if self.filter is not None:
+            started = time.perf_counter_ns()
+            values = self.filter.process(values)
+            self.metrics.timing('filter', time.perf_counter_ns() - started)
+        self.buffer.append_batch(times, values)
+        self.stats.extend(values)
+        return len(times)
+
     def get_data(self):
-        return list(range(len(self.time_stamps))), self.y_data_channels, self.time_stamps
+        if self.capture is not None:
+            return self.capture[0], self.capture[1]
+        if self.buffer is None:
+            return np.empty(0, dtype='datetime64[us]'), np.empty((0, 0))
+        return self.buffer.view()
 
     def add_cursor_on_click(self, event):
         if not self.plot_widget.sceneBoundingRect().contains(event.scenePos()):
             return
 
-        if not self.time_stamps:
+        if not self.buffer:
             return
 
         x = int(self.plot_widget.plotItem.vb.mapSceneToView(event.scenePos()).x())
@@ -333,9 +1527,9 @@ class SerialPlotter(QMainWindow):
         if self.cursor1 and self.cursor2:
             t1 = self.cursor1.get_time()
             t2 = self.cursor2.get_time()
-            if t1 and t2:
-                dt = abs((t2 - t1).total_seconds())
-                self.delta_label.setText(f"Δt = {dt:.3f} sec")
+            if t1 is not None and t2 is not None:
+                dt = abs((t2 - t1) / np.timedelta64(1, 's'))
+                self.delta_label.setText(f"Δt = {dt:.6f} sec")
             else:
                 self.delta_label.setText("Δt = ---")
         else:
@@ -359,30 +1553,50 @@ class SerialPlotter(QMainWindow):
 
     def load_csv_data(self):
         self.reset_cursors()
-        file_name, _ = QFileDialog.getOpenFileName(self, "Open CSV", "", "CSV Files (*.csv)")
+        file_name, _ = QFileDialog.getOpenFileName(
+            self, "Open CSV", "", f"CSV Files (*.csv);;Segmented Captures (*{INDEX_EXTENSION})"
+        )
         if not file_name:
             return
         try:
-            df = pd.read_csv(file_name)
+            self.buffer = None
+            self.pyramid = None
+            self.stats = None
+            self.channel_stats = None
+            self.capture = None
+            self.trigger_line = None
             self.plot_widget.clear()
             self.legend = self.plot_widget.addLegend()
-            self.y_data_channels = []
-            self.time_stamps = pd.to_datetime(df.iloc[:, 0]).to_list()
+            if file_name.endswith(INDEX_EXTENSION):
+                self.buffer = self.pyramid = SegmentedCapture(file_name, progress=self.show_load_progress)
+            else:
+                self.buffer = CaptureCache.open(file_name, progress=self.show_load_progress)
+                self.pyramid = MinMaxPyramid.build(self.buffer.view()[1])
             self.plot_lines = []
             self.legend_items = []
             self.curve_visibility = []
-            for i in range(1, df.shape[1]):
-                y = df.iloc[:, i].values
-                self.y_data_channels.append(list(y))
-                pen = pg.mkPen(color=pg.intColor(i-1), width=2)
-                plot = self.plot_widget.plot(y, pen=pen, name=f"Channel {i}")
+            self.channel_names = self.buffer.channel_names or [f"Channel {i+1}" for i in range(self.buffer.channels)]
+            for i in range(self.buffer.channels):
+                pen = pg.mkPen(color=pg.intColor(i), width=2)
+                plot = self.plot_widget.plot(pen=pen, name=self.channel_names[i])
                 self.plot_lines.append(plot)
                 self.curve_visibility.append(True)
             self._refresh_legend_clickable()
-            self.status_label.setText(f"📂 Loaded CSV: {file_name}")
+            self.plot_widget.enableAutoRange(axis='y')
+            self.plot_widget.setXRange(0, max(len(self.buffer) - 1, 1), padding=0.02)
+            self.render_plot()
+            if isinstance(self.buffer, SegmentedCapture):
+                self.status_label.setText(f"📂 Loaded capture: {file_name} "
+                                          f"({len(self.buffer)} samples in {len(self.buffer.segments)} segments)")
+            else:
+                self.status_label.setText(f"📂 Loaded CSV: {file_name} ({len(self.buffer)} samples)")
         except Exception as e:
             self.status_label.setText(f"❌ Load error: {str(e)}")
 
+    def show_load_progress(self, rows, capacity):
+        self.status_label.setText(f"⏳ Converting CSV: {rows}/{capacity} rows")
+        self.status_label.repaint()
+
     def _refresh_legend_clickable(self):
         self.legend_items.clear()
         items = []
@@ -407,19 +1621,28 @@ class SerialPlotter(QMainWindow):
             label.installEventFilter(self)
             label._legend_idx = i
             label.setAcceptHoverEvents(True)
-            visible = self.plot_lines[i].isVisible() if i < len(self.plot_lines) else True
-            color = pg.intColor(i).name()
-            channel_name = f"Channel {i+1}"
-            if visible:
-                html = f"<span style='font-weight:bold; color:{color};'>{channel_name}</span>"
-            else:
-                html = f"<span style='color:gray;'>{channel_name}</span>"
-            try:
-                label.setHtml(html)
-            except Exception:
-                label.setText(channel_name)
+            label.setText(self.legend_html(i))
             self.legend_items[i] = label
 
+    def legend_html(self, i):
+        visible = self.plot_lines[i].isVisible() if i < len(self.plot_lines) else True
+        color = pg.intColor(i).name()
+        channel_name = self.channel_names[i] if i < len(self.channel_names) else f"Channel {i+1}"
+        if visible:
+            html = f"<span style='font-weight:bold; color:{color};'>{channel_name}</span>"
+        else:
+            html = f"<span style='color:gray;'>{channel_name}</span>"
+        if self.channel_stats is not None and i < len(self.channel_stats[0]):
+            low, high, mean, rms = (values[i] for values in self.channel_stats)
+            html += (f" <span style='color:gray;'>min {low:.4g} max {high:.4g} "
+                     f"mean {mean:.4g} rms {rms:.4g}</span>")
+        return html
+
+    def update_legend_stats(self):
+        for i, label in enumerate(self.legend_items):
+            if label is not None:
+                label.setText(self.legend_html(i))
+
     def eventFilter(self, obj, event):
         if hasattr(obj, "_legend_idx"):
             if event.type() in (event.GraphicsSceneMousePress, event.MouseButtonPress) and event.button() == Qt.LeftButton:
@@ -460,25 +1683,31 @@ class SerialPlotter(QMainWindow):
         dialog.exec_()
 
     def show_data_table(self):
-        if not self.y_data_channels or not self.time_stamps:
+        if not self.buffer:
             self.status_label.setText("⚠️ No data available.")
             return
         dialog = QDialog(self)
         dialog.setWindowTitle("📊 Data Table")
         layout = QVBoxLayout()
-        table = QTableWidget()
-        rows = len(self.time_stamps)
-        cols = len(self.y_data_channels) + 1
-        table.setRowCount(rows)
-        table.setColumnCount(cols)
-        headers = ["Timestamp"] + [f"Ch{i+1}" for i in range(cols-1)]
-        table.setHorizontalHeaderLabels(headers)
-        for i in range(rows):
-            table.setItem(i, 0, QTableWidgetItem(self.time_stamps[i].strftime('%H:%M:%S.%f')[:-3]))
-            for j in range(len(self.y_data_channels)):
-                if i < len(self.y_data_channels[j]):
-                    table.setItem(i, j+1, QTableWidgetItem(str(self.y_data_channels[j][i])))
+        model = SampleTableModel(self.get_data)
+        table = QTableView()
+        table.setModel(model)
+        table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        table.verticalHeader().setDefaultSectionSize(table.fontMetrics().height() + 6)
         table.resizeColumnsToContents()
+        follow_checkbox = QCheckBox("Follow live data")
+        follow_checkbox.setEnabled(self.reading)
+        follow_checkbox.setChecked(self.reading)
+
+        def follow():
+            if self.reading and follow_checkbox.isChecked():
+                model.refresh()
+                table.scrollToBottom()
+
+        follow_timer = QTimer(dialog)
+        follow_timer.timeout.connect(follow)
+        follow_timer.start(250)
+        layout.addWidget(follow_checkbox)
         layout.addWidget(table)
         dialog.setLayout(layout)
         dialog.resize(800, 400)
@@ -486,14 +1715,20 @@ class SerialPlotter(QMainWindow):
 
     def change_update_rate(self, value):
         try:
-            self.update_every_n = int(value)
-            self.status_label.setText(f"🔄 Update rate set to {self.update_every_n}")
+            self.target_fps = int(value)
+            if self.timer.isActive():
+                self.timer.setInterval(self.frame_interval_ms())
+            self.status_label.setText(f"🔄 Target FPS set to {self.target_fps}")
         except Exception:
             self.status_label.setText("⚠️ Invalid update rate")
 
     def change_max_samples(self, value):
         try:
             self.max_samples = int(value)
+            if self.buffer and self.reading:
+                self.buffer.resize(self.max_samples)
+                self.stats = WindowStats(self.buffer.channels, self.max_samples)
+                self.stats.extend(self.buffer.view()[1].T)
             self.status_label.setText(f"🔢 Max samples set to {self.max_samples}")
         except Exception:
             self.status_label.setText("⚠️ Invalid max samples")
@@ -0,0 +1,22 @@
+#Mohammed Adel Alshreif (MLS)
+# Tests for the streaming filters: python -m pytest -q
+import numpy as np
+import pytest
+
+from dsp import make_filter
+
+@pytest.mark.parametrize('kind', ["Moving Average", "FIR Low-pass", "IIR Low-pass", "IIR High-pass"])
+def test_filter_chunked_matches_one_pass(kind):
+    rng = np.random.default_rng(3)
+    values = rng.normal(0, 1, (3000, 2)) + np.sin(np.arange(3000) / 30)[:, None]
+    values[rng.random(values.shape) < 0.02] = np.nan
+    # the second channel starts late, as a port that has not sent yet
+    values[:700, 1] = np.nan
+    whole = make_filter(kind, 1000, 50, 16).process(values)
+    chunked_filter = make_filter(kind, 1000, 50, 16)
+    chunked = np.concatenate([chunked_filter.process(values[start:start + 333])
+                              for start in range(0, 3000, 333)])
+    np.testing.assert_allclose(chunked, whole, rtol=1e-9, atol=1e-9)
+    # gaps stay gaps and never poison the state
+    np.testing.assert_array_equal(np.isnan(whole), np.isnan(values))
+    assert np.isfinite(whole[-1]).all()
@@ -0,0 +1,126 @@
+#Mohammed Adel Alshreif (MLS)
+# Tests for the engine's parsers and trigger: python -m pytest -q
+import time
+
+import numpy as np
+import pytest
+import serial
+
+from engine import AcquisitionEngine, FrameParser, LineParser, Trigger
+
+def feed_in_chunks(parser, data, cuts):
+    bounds = np.concatenate([[0], np.sort(cuts), [len(data)]])
+    parts = [parser.feed(data[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+    # nothing parsed yet comes back as 0 x 0
+    return np.concatenate([part for part in parts if len(part)])
+
+def csv_stream(values):
+    return ''.join(','.join(map(str, row)) + '\n' for row in values.tolist()).encode()
+
+def frames_stream(values, sync=b'\xAA\x55'):
+    # int16 frames with a sum8 checksum
+    return b''.join(sync + row.tobytes() + bytes([row.view(np.uint8).sum() & 0xFF]) for row in values)
+
+def test_line_parser_chunked_matches_whole():
+    rng = np.random.default_rng(0)
+    values = rng.integers(-1000, 1000, (500, 3)).astype(np.float64)
+    data = csv_stream(values)
+    whole = LineParser().feed(data)
+    chunked = feed_in_chunks(LineParser(), data, rng.integers(0, len(data), 40))
+    # the first line could be a fragment of one, so it is not used
+    np.testing.assert_array_equal(whole, values[1:])
+    np.testing.assert_array_equal(chunked, whole)
+
+def test_line_parser_ignores_fragment_when_detecting_channels():
+    parser = LineParser()
+    values = feed_in_chunks(parser, b'7,8\n1,2,3,4\n5,6,7,8\n9,10,11,12\n', [1, 12])
+    assert parser.channels == 4
+    np.testing.assert_array_equal(values, [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12]])
+    assert parser.malformed == 0
+
+def test_line_parser_one_byte_at_a_time():
+    # an idle port is read one byte per call until data arrives
+    data = b'7,8\n1,2,3,4\n5,6,7,8\n9,10,11,12\n13,14,15,16\n'
+    parser = LineParser()
+    values = feed_in_chunks(parser, data, np.arange(1, len(data)))
+    assert parser.channels == 4
+    np.testing.assert_array_equal(values, np.arange(1, 17).reshape(4, 4))
+    assert parser.malformed == 0
+
+def test_frame_parser_chunked_matches_whole():
+    rng = np.random.default_rng(1)
+    values = rng.integers(-30000, 30000, (500, 4)).astype('<i2')
+    data = frames_stream(values)
+    whole = FrameParser(4, checksum='sum8').feed(data)
+    chunked = feed_in_chunks(FrameParser(4, checksum='sum8'), data, rng.integers(0, len(data), 40))
+    np.testing.assert_array_equal(whole, values)
+    np.testing.assert_array_equal(chunked, whole)
+
+def test_frame_parser_resyncs_after_corrupt_frame():
+    values = np.arange(40, dtype='<i2').reshape(10, 4)
+    data = bytearray(frames_stream(values))
+    frame_size = 2 + 8 + 1
+    data[4 * frame_size + 5] ^= 0xFF
+    parser = FrameParser(4, checksum='sum8')
+    np.testing.assert_array_equal(parser.feed(bytes(data)), np.delete(values, 4, axis=0))
+    assert parser.malformed == 1
+
+def test_crc16_is_ccitt_false():
+    # the CRC-16/CCITT-FALSE check value, stored little endian after the payload
+    good = b'\xAA\x55' + b'123456789' + (0x29B1).to_bytes(2, 'little')
+    bad = b'\xAA\x55' + b'123456789' + (0x29B2).to_bytes(2, 'little')
+    parser = FrameParser(9, dtype='uint8', checksum='crc16')
+    np.testing.assert_array_equal(parser.feed(good), [list(b'123456789')])
+    assert len(parser.feed(bad)) == 0
+    assert parser.malformed == 1
+
+def stamps(n, step_us=1000):
+    return np.datetime64('2026-01-01T00:00:00', 'us') + np.arange(n) * np.timedelta64(step_us, 'us')
+
+def test_trigger_hysteresis():
+    x = np.array([-1, 0.1, -0.1, 0.1, -0.1, 0.1, -1, 0.2])
+    np.testing.assert_array_equal(Trigger(level=0, hysteresis=0.5).edges(x), [1, 7])
+    np.testing.assert_array_equal(Trigger(level=0).edges(x), [1, 3, 5, 7])
+
+def test_trigger_holdoff():
+    # rising edges every 20 samples (ms), at 10, 30, 50, ...
+    x = np.where(np.arange(200) % 20 >= 10, 1.0, -1.0)
+    trigger = Trigger(level=0, holdoff=0.025, pre=2, post=2)
+    captures = trigger.process(stamps(200), x[:, None])
+    assert [times[index] for times, _, index in captures] == list(stamps(200)[[10, 50, 90, 130, 170]])
+
+def test_trigger_pre_post_across_batches():
+    # first crossing at sample 105, so every capture has all its pre samples
+    x = -np.cos(np.arange(3000) / 50)
+    times = stamps(3000)
+    whole = Trigger(level=0.5, pre=100, post=300).process(times, x[:, None])
+    trigger = Trigger(level=0.5, pre=100, post=300)
+    chunked = [capture for start in range(0, 3000, 77)
+               for capture in trigger.process(times[start:start + 77], x[start:start + 77, None])]
+    assert len(whole) == len(chunked) > 1
+    for (t1, v1, i1), (t2, v2, i2) in zip(whole, chunked):
+        assert len(t1) == 400 and i1 == i2 == 100
+        assert v1[i1 - 1, 0] < 0.5 <= v1[i1, 0]
+        np.testing.assert_array_equal(t1, t2)
+        np.testing.assert_array_equal(v1, v2)
+
+def test_bad_trigger_channel_only_turns_the_trigger_off():
+    engine = AcquisitionEngine([("sim:rate=1000,channels=2", 115200)], trigger=Trigger(channel=4))
+    engine.start()
+    try:
+        deadline = time.monotonic() + 5
+        while engine.trigger_error is None and time.monotonic() < deadline:
+            time.sleep(0.02)
+            engine.poll()
+    finally:
+        engine.stop()
+        engine.close()
+    assert engine.trigger_error == "channel 5 does not exist"
+    assert engine.trigger is None
+    assert engine.error is None
+
+def test_port_that_cannot_open_leaves_no_log(tmp_path):
+    log = tmp_path / 'bad.csv'
+    with pytest.raises(serial.SerialException):
+        AcquisitionEngine([(str(tmp_path / 'no_such_tty'), 115200)], log_filename=str(log))
+    assert not log.exists()
@@ -0,0 +1,50 @@
+#Mohammed Adel Alshreif (MLS)
+# Tests for the GUI's sample store, capture cache and running stats: python -m pytest -q
+import warnings
+
+import numpy as np
+import pytest
+
+main = pytest.importorskip('main')
+
+def test_window_stats_matches_nan_reductions():
+    rng = np.random.default_rng(2)
+    ring = main.RingBuffer(3, 1000)
+    stats = main.WindowStats(3, 1000, block=64)
+    values = rng.normal(0, 10, (5000, 3))
+    values[rng.random(values.shape) < 0.05] = np.nan
+    values[:300, 2] = np.nan
+    times = np.datetime64('2026-01-01T00:00:00', 'us') + np.arange(len(values))
+    pos = 0
+    while pos < len(values):
+        n = int(rng.integers(1, 400))
+        ring.append_batch(times[pos:pos + n], values[pos:pos + n])
+        stats.extend(values[pos:pos + n])
+        pos += n
+        data = ring.view()[1]
+        mins, maxs, means, rms = stats.compute(data)
+        # an all NaN channel (the third at the start) has no min, max or mean
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            np.testing.assert_allclose(mins, np.nanmin(data, axis=1))
+            np.testing.assert_allclose(maxs, np.nanmax(data, axis=1))
+            np.testing.assert_allclose(means, np.nanmean(data, axis=1))
+            np.testing.assert_allclose(rms, np.sqrt(np.nanmean(data ** 2, axis=1)))
+
+def test_capture_cache_converts_csv(tmp_path):
+    source = tmp_path / 'capture.csv'
+    source.write_text("Time,a,b\n10:00:00.000001,1,2\n10:00:00.000002,3,nan\n")
+    cache = main.CaptureCache.open(str(source))
+    times, data = cache.view()
+    assert cache.channel_names == ['a', 'b']
+    np.testing.assert_array_equal(data, [[1, 3], [2, np.nan]])
+    assert len(times) == 2
+    del cache, times, data
+
+def test_capture_cache_leaves_nothing_behind_on_failure(tmp_path):
+    # the bad value is in the second chunk, once the memmaps are open
+    source = tmp_path / 'bad.csv'
+    source.write_text("10:00:00.000001,1\n10:00:00.000002,x\n")
+    with pytest.raises(ValueError):
+        main.CaptureCache.open(str(source), chunk_rows=1)
+    assert [path.name for path in tmp_path.iterdir()] == ['bad.csv']